@@ -0,0 +1,84 @@
+# Database codec benchmark
+# Compare encode/decode time and payload size of every available codec
+# on a synthetic WORKS dataset, both as one value and as per-guild hash fields.
+# No Redis server is needed.
+
+### Settings
+
+GUILDS = 1_000
+MAX_WORKS_PER_GUILD = 24 # Same as assignment_limit in config.py
+ROUNDS = 5
+SEED = 48
+
+### ---
+
+import time
+import random
+import secrets
+import datetime
+from typing import Callable, Dict
+
+from src.db import CODECS, decode
+
+random.seed(SEED)
+
+
+def make_work(key: str) -> dict:
+    date = datetime.date(2023, 1, 1) + datetime.timedelta(days=random.randint(0, 365))
+    return {
+        "title": random.choice(("Math", "Physics", "Chemistry", "English", "Thai", "Biology")) + " homework",
+        "desc": " ".join(secrets.token_hex(4) for _ in range(random.randint(0, 30))) or "No Description Provided",
+        "date": date.strftime("%d/%m/%Y"),
+        "image-url": random.choice(("Not Attached", f"https://cdn.discordapp.com/attachments/{secrets.token_hex(8)}/image.jpg")),
+        "readable-date": date.strftime("%A %d %B %Y"),
+        "already-passed": random.random() < 0.3,
+        "date-tracker": date.strftime("%d-%m-%Y"),
+        "lasted": random.choice((1, 1, 1, 2, 3, 7)),
+        "key": key
+    }
+
+
+def make_dataset() -> Dict[str, dict]:
+    data = {}
+    for _ in range(GUILDS):
+        guild_id = str(random.randint(10**17, 10**18))
+        keys = [secrets.token_hex(4) for _ in range(random.randint(0, MAX_WORKS_PER_GUILD))]
+        data[guild_id] = {key: make_work(key) for key in keys}
+    return data
+
+
+def timeit(func: Callable) -> float:
+    """ Best time of ROUNDS in milliseconds. """
+    best = float("inf")
+    for _ in range(ROUNDS):
+        t = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - t)
+    return best * 1000
+
+
+data = make_dataset()
+print(f"{GUILDS} guilds, {sum(len(i) for i in data.values())} assignments, best of {ROUNDS}\n")
+print(f"{'codec':<10}{'layout':<10}{'encode ms':>12}{'decode ms':>12}{'size KiB':>12}")
+
+for codec in CODECS.values():
+    # Old layout, Every guild in one value.
+    blob = codec.encode(data)
+    assert decode(blob) == data, f"{codec.name} did not round-trip"
+
+    print(
+        f"{codec.name:<10}{'blob':<10}"
+        f"{timeit(lambda: codec.encode(data)):>12.2f}"
+        f"{timeit(lambda: decode(blob)):>12.2f}"
+        f"{len(blob) / 1024:>12.1f}"
+    )
+
+    # GUILD-WORKS layout, One hash field per guild.
+    fields = {guild_id: codec.encode(works) for guild_id, works in data.items()}
+
+    print(
+        f"{codec.name:<10}{'fields':<10}"
+        f"{timeit(lambda: [codec.encode(works) for works in data.values()]):>12.2f}"
+        f"{timeit(lambda: [decode(value) for value in fields.values()]):>12.2f}"
+        f"{sum(len(i) for i in fields.values()) / 1024:>12.1f}"
+    )
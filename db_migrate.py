@@ -1,28 +1,39 @@
 # Database Migrating tools
 # Use to transfer data from
 # Replit -> Redis
+# Redis (WORKS, one value) -> Redis (GUILD-WORKS, one hash field per guild)
 
 ### Settings
 
 URL = "REPLIT DB URL"
 TEST = True
+# Only move the old WORKS value into the GUILD-WORKS hash, Replit is not needed.
+WORKS_ONLY = False
 
 ### --- 
 
 import json
-from typing import Any
-from replit.database import database
-
-replit_db = database.Database(URL)
+from typing import Any, Dict
 
 if TEST:
     class TestDatabase:
         def __init__(self) -> None:
             self.data = {}
 
+        def loads(self, key: str, backoff: Any = None) -> Any:
+            return self.data.get(key, backoff)
+
         def dumps(self, key: str, value: Any) -> None:
             self.data[key] = value
 
+        def hdumps(self, key: str, mapping: Dict[str, Any]) -> bool:
+            self.data.setdefault(key, {}).update(mapping)
+            return True
+
+        def renames(self, key: str, new_key: str) -> bool:
+            self.data[new_key] = self.data.pop(key)
+            return True
+
         def show(self) -> None:
             print(json.dumps(self.data, indent=2))
 
@@ -31,6 +42,42 @@ else:
     from src.db import RedisDatabase
     redis_db = RedisDatabase()
 
+### --- Assignment: Assignments data, Each guild in its own hash field.
+# GUILD-WORKS
+# {
+#     "GUILD_ID": {
+#         "key": {
+#             "title": str,
+#             "desc": str,
+#             "date": str,
+#             "image-url": str,
+#             "readable-date": str,
+#             "already-passed": bool,
+#             "date-tracker": str,
+#             "key": str,
+#         }
+#     }
+# }
+
+def dump_works(data: Dict[str, dict]) -> None:
+    redis_db.hdumps("GUILD-WORKS", data)
+    print(f"Moved {len(data)} guilds into GUILD-WORKS")
+
+if WORKS_ONLY:
+    works = dict(redis_db.loads("WORKS", {}))
+    if works:
+        dump_works(works)
+        # The bot migrates WORKS again if it's still there, Bringing deleted works back.
+        redis_db.renames("WORKS", "WORKS-MIGRATED")
+
+    if TEST:
+        redis_db.show()
+    raise SystemExit
+
+from replit.database import database
+
+replit_db = database.Database(URL)
+
 ### --- Assignment: Active and Passed channels
 # {
 #   "GUILD_ID": {
@@ -85,23 +132,6 @@ redis_db.dumps(
 )
 
 ### --- Assignment: Assignments data
-# {
-#     "GUILD_ID": {
-#         {
-#             "key": {
-#                 "title": str,
-#                 "desc": str,
-#                 "date": str,
-#                 "image-url": str,
-#                 "readable-date": str,
-#                 "already-passed": bool,
-#                 "date-tracker": str,
-#                 "key": str,
-#             }
-#         }
-#     }
-# }
-
 data = {}
 old = replit_db["WORKS"]
 
@@ -110,7 +140,7 @@ for guild_id in old:
     for key in old[guild_id]:
         data[guild_id][key] = database.to_primitive( old[guild_id][key] )
 
-redis_db.dumps("WORKS", data)
+dump_works(data)
 
 if TEST:
     redis_db.show()
\ No newline at end of file
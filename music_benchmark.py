@@ -0,0 +1,108 @@
+# Music queue memory benchmark
+# Compare memory used by queued songs holding the command context (old layout)
+# against songs holding only IDs, on synthetic queues filled by playlist commands.
+# No Discord connection is needed.
+
+### Settings
+
+GUILDS = 100
+TRACKS_PER_GUILD = 10_000
+TRACKS_PER_COMMAND = 500 # One Spotify playlist page burst, Every command has its own context.
+SEED = 48
+
+### ---
+
+import gc
+import os
+import sys
+import random
+import secrets
+import weakref
+import tracemalloc
+from types import SimpleNamespace
+from typing import Callable, List
+
+# Cogs import config and utils as top-level modules.
+sys.path.insert(0, "src")
+# Nothing is searched, But the music modules refuse to import without keys.
+for key in ("YOUTUBE_API_KEY", "CID", "SECRET"):
+    os.environ.setdefault(key, "benchmark")
+
+from exts.music import Song, SongQueue
+
+random.seed(SEED)
+
+
+class Stub(SimpleNamespace):
+    """ Discord object stand-in, Weak referenceable so leaks can be counted. """
+
+
+class LegacySong:
+    """ Song before it was made compact, Kept here to compare against. """
+    __slots__ = "url", "title", "ctx", "requester", "source", "info", "prefetch"
+
+    def __init__(self, url: str, ctx: Stub, title: str = None):
+        self.url = url
+        self.title = title
+        self.ctx = ctx
+        self.requester = ctx.author
+        self.source = None
+        self.info = None
+        self.prefetch = None
+
+
+def make_context(guild: Stub) -> Stub:
+    """ Rough stand-in for commands.Context, Each message carries its own content and cached objects. """
+    author = Stub(id = random.randint(10**17, 10**18), name = secrets.token_hex(8), roles = [object() for _ in range(5)])
+    channel = random.choice(guild.channels)
+    message = Stub(
+        id = random.randint(10**17, 10**18), content = ",p https://open.spotify.com/playlist/" + secrets.token_hex(11),
+        author = author, channel = channel, guild = guild, embeds = [], attachments = [], reactions = [],
+        raw = {secrets.token_hex(4): secrets.token_hex(16) for _ in range(20)}
+    )
+    return Stub(message = message, author = author, channel = channel, guild = guild, prefix = ",", args = [], kwargs = {})
+
+
+def make_tracks() -> List[str]:
+    return [f"{secrets.token_hex(6)} - {secrets.token_hex(10)}" for _ in range(TRACKS_PER_GUILD)]
+
+
+def fill(make_song: Callable) -> tuple:
+    """ Fill every guild queue, Return (queues, weak references to every context). """
+    queues, contexts = [], []
+    for _ in range(GUILDS):
+        guild = Stub(id = random.randint(10**17, 10**18), channels = [Stub(id = random.randint(10**17, 10**18)) for _ in range(10)])
+        queue = SongQueue()
+        tracks = make_tracks()
+        for start in range(0, len(tracks), TRACKS_PER_COMMAND):
+            ctx = make_context(guild)
+            contexts.append(weakref.ref(ctx.message))
+            for track in tracks[start:start + TRACKS_PER_COMMAND]:
+                queue.put_nowait(make_song(track, ctx))
+            del ctx
+        queues.append(queue)
+    return queues, contexts
+
+
+def measure(name: str, make_song: Callable) -> None:
+    gc.collect()
+    tracemalloc.start()
+    queues, contexts = fill(make_song)
+    gc.collect()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    songs = sum(len(queue) for queue in queues)
+    alive = sum(ref() is not None for ref in contexts)
+    print(
+        f"{name:<10}{current / 1024 ** 2:>12.1f}{peak / 1024 ** 2:>12.1f}"
+        f"{current / songs:>14.0f}{alive:>10}/{len(contexts)}"
+    )
+
+
+print(f"{GUILDS} guilds, {TRACKS_PER_GUILD} tracks each, {TRACKS_PER_COMMAND} tracks per command\n")
+print(f"{'layout':<10}{'MiB':>12}{'peak MiB':>12}{'bytes/song':>14}{'contexts alive':>16}")
+
+# Track names are counted in both, They are what a queue has to keep anyway.
+measure("context", lambda track, ctx: LegacySong(track, ctx))
+measure("ids", lambda track, ctx: Song.from_ctx(track, ctx))
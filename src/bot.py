@@ -5,13 +5,16 @@ Made by Tpmonkey
 
 import os
 import sys
+import json
 import time
 import random
+import hashlib
 import asyncio
 import logging
 import datetime
 import traceback
 from typing import Any
+from functools import lru_cache
 from PIL import Image
 from aiohttp import ClientSession
 
@@ -21,6 +24,8 @@ from discord.ext import commands
 import config
 from db import Database
 from utils.time import today_th
+from utils.planner import parse_iso_date
+from utils.writebehind import WriteBehind
 from utils import planner, manager, reminderManager
 
 log = logging.getLogger(__name__)
@@ -75,14 +80,14 @@ class Settings:
 
         self._settings[guild_id][setting] = value
 
-        self._bot.database.dumps("MUSIC", self._settings)
+        self._bot.persist.mark("MUSIC", self._settings)
     
     def delete(self, guild_id: int) -> None:
         """Delete guild settings
         """
         try:
             del self._settings[str(guild_id)]
-            self._bot.database.dumps("MUSIC", self._settings)
+            self._bot.persist.mark("MUSIC", self._settings)
         except KeyError:
             pass
 
@@ -101,7 +106,14 @@ class Bot(commands.AutoShardedBot):
         self.trust_session = None   
 
         # Define database here so It's easier to be use.
-        self.database = Database()
+        self.database = Database(
+            url = config.redis_url,
+            max_connections = config.redis_max_connections,
+            timeout = config.redis_timeout,
+            codec = config.database_codec
+        )
+        # Managers only mark their data dirty, This will save it in batches.
+        self.persist = WriteBehind(self.database, config.database_flush_interval)
         self.msettings = Settings(self)
         self.planner = planner.Planner(self)
         self.manager = manager.Manager(self)
@@ -153,6 +165,10 @@ class Bot(commands.AutoShardedBot):
 
         self.trust_session = ClientSession()
 
+    async def setup_hook(self) -> None:
+        """ Called once the event loop is running, before connecting. """
+        self.persist.start()
+
     async def add_cog(self, cog: commands.Cog) -> None:
         """ Add Cog event, Need for logging. """
         await super().add_cog(cog)
@@ -195,6 +211,8 @@ class Bot(commands.AutoShardedBot):
     
     async def close(self) -> None:
         await super().close()
+        await self.persist.close()
+        await self.database.close()
 
         # Work around for replit rate-limited.
         # os.system("kill 1")
@@ -385,7 +403,7 @@ class Bot(commands.AutoShardedBot):
             date2 = today_th()
         strpped = self.planner.try_strp_date(date1)
         
-        return None if strpped is None else (strpped - datetime.datetime.strptime(date2, "%Y-%m-%d")).days
+        return None if strpped is None else (strpped - parse_iso_date(date2)).days
     
     def get_colour(self, date: str = "", gap: int = None, passed: bool = False, lasted: int = 1) -> discord.Colour:
         """
@@ -424,12 +442,12 @@ class Bot(commands.AutoShardedBot):
             return discord.Colour.dark_red()
         return discord.Colour.default()
     
-    def get_title(self, title: str, date: str, passed: bool = False, lasted: int = 1) -> str:
+    def get_title(self, title: str, date: str, passed: bool = False, lasted: int = 1, gap: int = None) -> str:
         """ Get Embed Title. """
         if passed: 
             return title + " [ PASSED ]"
 
-        in_day = self.in_days(date)
+        in_day = self.in_days(date) if gap is None else gap
         
         if in_day is None: 
             in_day = ""
@@ -504,6 +522,21 @@ class Bot(commands.AutoShardedBot):
         
         log.debug("successfully created assignment embed")
         return embed
+
+    def get_digest(self, **kwargs) -> str:
+        """
+        Get a fingerprint of Assignment Embed, Same embed always gives the same digest.
+        Takes the same kwargs as get_embed, Embed will only be rendered once a day.
+        """
+        return self._get_digest(tuple(sorted(kwargs.items())), today_th())
+
+    @lru_cache(maxsize = 2048)
+    def _get_digest(self, work: tuple, today: str) -> str:
+        # Timestamp is always different, ignore it.
+        embed = self.get_embed(**dict(work)).to_dict()
+        embed.pop("timestamp", None)
+
+        return hashlib.sha1(json.dumps(embed, sort_keys = True).encode()).hexdigest()
     
     async def update(self, ctx: commands.Context, url: str = None) -> None:
         """Update itself from github"""
@@ -3,6 +3,8 @@ Bot Configuration File.
 Made by Tpmonkey
 """
 
+import os
+
 ### ---------- General ---------- ###
 
 fb_url = "https://forms.gle/F82RcF1VWVLJjzMR6"
@@ -38,13 +40,45 @@ image_channel_id = 810802238682824744
 dump_channel_id = 833825510219972638
 # --------------------------------- #
 
+### ---------- Database ---------- ###
+
+redis_url = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+redis_max_connections = 32 # Connection pool size.
+redis_timeout = 5 # seconds, for both connecting and commands.
+database_codec = "json" # json (faster with orjson installed), msgpack or pickle. Old values are still readable after changing.
+database_flush_interval = 5 # seconds, changes are batched and written at this interval.
+# --------------------------------- #
+
 ### -------- Extensions -------- ###
 
 # Cooldown for loop
 update_work_cooldown = 2 # mins
-check_day_cooldown = 1 # min
+day_resync = 60 # mins, Longest sleep before re-checking the clock while waiting for a new day.
 kus_news_cooldown = 4 # hours
 
+# Active-works updater
+update_workers = 4 # Guilds being updated at the same time.
+update_global_limit = (5, 1) # (operations, seconds) Edits/sends/deletes across all guilds.
+update_channel_limit = (5, 5) # (operations, seconds) Edits/sends/deletes in one channel.
+update_rescan_every = 15 # updates, Scan channel history instead of cached message IDs once in a while.
+
+# Music
+music_prefetch = 2 # Next tracks in queue to load while the current one is playing.
+music_info_cache = 16 # MB, Resolved tracks kept until their stream url expires.
+music_search_cache = 4 # MB each, Youtube API search and playlist results. Kept across restarts.
+music_search_ttl = 24 # hours
+music_playlist_ttl = 1 # hours
+music_api_workers = 4 # Youtube API/Spotify calls at the same time.
+music_api_timeout = 10 # seconds, for each call.
+audio_workers = 0 # Processes running PCM audio (effect, volume), 0 runs it in the bot process.
+audio_cache_size = 0 # MB, Hot tracks kept on disk as opus. 0 to disable.
+audio_cache_path = "audio-cache"
+music_queue_deadline = 2 # seconds, Queue command shows unresolved titles as they are after this.
+music_snapshot_interval = 30 # seconds, Changed queues are saved to continue after restarting.
+spotify_track_limit = 1000 # Tracks enqueued from one Spotify playlist/album.
+spotify_seed_cache = 1 # MB, Track name to uri, for recommendations.
+spotify_seed_deadline = 5 # seconds, Seeds not found by then are skipped.
+
 # KUS News URL
 main_url = "https://www.kus.ku.ac.th/"
 news_url = "https://www.kus.ku.ac.th/news.php?type=0"
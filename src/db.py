@@ -1,14 +1,133 @@
+import json
 import pickle
 import traceback
 from logging import getLogger
-from typing import Any, Optional
+from typing import Any, Dict, Iterable, List, Optional
 
 log = getLogger(__name__)
 
+# Every value written by a codec starts with HEADER, then format version and codec ID (1 byte each).
+# Pickle never starts with 0xff, so values without the header are old pickled values.
+HEADER = b"\xffTP"
+FORMAT_VERSION = 1
+
+
+class Codec:
+    """Serialization format for values stored in Redis."""
+    id = None
+    name = None
+
+    def dumps(self, value: Any) -> bytes:
+        raise NotImplementedError
+
+    def loads(self, data: bytes) -> Any:
+        raise NotImplementedError
+
+    def encode(self, value: Any) -> bytes:
+        """Serialize value with a header, Fall back to pickle if the value is not supported."""
+        try:
+            return HEADER + bytes((FORMAT_VERSION, self.id)) + self.dumps(value)
+        except (TypeError, ValueError, OverflowError) as e:
+            log.warning(f"{self.name} cannot serialize {type(value).__name__}, using pickle instead; {e}")
+            return CODECS[PickleCodec.id].encode(value)
+
+
+class PickleCodec(Codec):
+    id = 0
+    name = "pickle"
+
+    def dumps(self, value: Any) -> bytes:
+        return pickle.dumps(value, protocol = pickle.HIGHEST_PROTOCOL)
+
+    def loads(self, data: bytes) -> Any:
+        return pickle.loads(data)
+
+    def encode(self, value: Any) -> bytes:
+        return HEADER + bytes((FORMAT_VERSION, self.id)) + self.dumps(value)
+
+
+class JsonCodec(Codec):
+    """JSON, Uses orjson if installed."""
+    id = 1
+    name = "json"
+
+    def dumps(self, value: Any) -> bytes:
+        if HAS_ORJSON:
+            return orjson.dumps(value)
+        # json turns other keys into strings and they won't come back the same, orjson raises instead.
+        self.check_keys(value)
+        return json.dumps(value, separators = (",", ":"), ensure_ascii = False, allow_nan = False).encode()
+
+    @classmethod
+    def check_keys(cls, value: Any) -> None:
+        """Raise TypeError if any dict has a key that is not str."""
+        if isinstance(value, dict):
+            for key, item in value.items():
+                if not isinstance(key, str):
+                    raise TypeError(f"dict key must be str, not {type(key).__name__}")
+                cls.check_keys(item)
+        elif isinstance(value, (list, tuple)):
+            for item in value:
+                cls.check_keys(item)
+
+    def loads(self, data: bytes) -> Any:
+        if HAS_ORJSON:
+            return orjson.loads(data)
+        return json.loads(data)
+
+
+class MsgpackCodec(Codec):
+    id = 2
+    name = "msgpack"
+
+    def dumps(self, value: Any) -> bytes:
+        return msgpack.packb(value, use_bin_type = True)
+
+    def loads(self, data: bytes) -> Any:
+        return msgpack.unpackb(data, raw = False, strict_map_key = False)
+
+
+def get_codec(name: str) -> Codec:
+    """Get a codec by name, Fall back to json if its library is not installed."""
+    for codec in CODECS.values():
+        if codec.name == name:
+            return codec
+    
+    log.warning(f"Codec {name} is not available, using json instead.")
+    return CODECS[JsonCodec.id]
+
+
+def decode(data: bytes) -> Any:
+    """Deserialize a value written by any codec, or an old pickled value."""
+    if not data.startswith(HEADER):
+        return pickle.loads(data)
+
+    version, codec_id = data[len(HEADER)], data[len(HEADER) + 1]
+    if version > FORMAT_VERSION:
+        raise ValueError(f"Unknown format version {version}, Please update the bot.")
+    
+    try:
+        codec = CODECS[codec_id]
+    except KeyError:
+        raise ValueError(f"Codec {codec_id} is not available, Please install it.")
+    return codec.loads(data[len(HEADER) + 2:])
+
 
 class RedisDatabase:
-    def __init__(self):
-        self.pool = redis.Redis()
+    def __init__(self, url: str = "redis://localhost:6379/0", max_connections: int = 32, timeout: float = 5, codec: str = "json"):
+        self.codec = get_codec(codec)
+
+        options = {
+            "max_connections": max_connections,
+            "socket_timeout": timeout,
+            "socket_connect_timeout": timeout,
+            "health_check_interval": 30
+        }
+
+        # Blocking client, Only use it on startup or outside of the event loop (e.g. db_migrate.py)
+        self.pool = redis.Redis(connection_pool = redis.ConnectionPool.from_url(url, **options))
+        # Non-blocking client, Everything that runs on the event loop should use this one.
+        self.apool = aioredis.Redis(connection_pool = aioredis.ConnectionPool.from_url(url, **options))
 
         assert self.ping(), "Cannot connect to Redis server."
     
@@ -33,7 +152,7 @@ class RedisDatabase:
 
         if ret is None:
             return backoff
-        return pickle.loads(ret)
+        return decode(ret)
     
     async def load(self, key :str, backoff: Any = None) -> Any:
         """(Async) Get value at a key. If doesn't exist, return backoff.
@@ -45,7 +164,27 @@ class RedisDatabase:
         Returns:
             Any: Value at a key.
         """
-        return self.loads(key, backoff)
+        ret = await self.apool.get(key)
+
+        if ret is None:
+            return backoff
+        return decode(ret)
+
+    async def load_many(self, keys: Iterable[str], backoff: Any = None) -> List[Any]:
+        """(Async) Get values at multiple keys in one round-trip.
+
+        Args:
+            keys (Iterable[str]): Redis keys.
+            backoff (Any, optional): Backoff value for missing keys. Defaults to None.
+
+        Returns:
+            List[Any]: Values in the same order as keys.
+        """
+        keys = list(keys)
+        if not keys:
+            return []
+
+        return [backoff if ret is None else decode(ret) for ret in await self.apool.mget(keys)]
 
     def dumps(self, key: str, value: Any, **kwargs) -> bool:
         """Set value at a key.
@@ -61,7 +200,7 @@ class RedisDatabase:
         try:
             self.pool.set(
                 name = key,
-                value = pickle.dumps(value),
+                value = self.codec.encode(value),
                 **kwargs
             )
         except Exception as e: # A lot to expect.
@@ -80,11 +219,189 @@ class RedisDatabase:
         Returns:
             bool: Success or not.
         """
-        return self.dumps(key, value, **kwargs)
+        try:
+            await self.apool.set(
+                name = key,
+                value = self.codec.encode(value),
+                **kwargs
+            )
+        except Exception as e: # A lot to expect.
+            log.warning(f"Cannot set key {key}; {e}")
+            return False
+        return True
+
+    async def dump_many(self, mapping: Dict[str, Any]) -> bool:
+        """(Async) Set values at multiple keys, Pipelined into one round-trip.
+
+        Args:
+            mapping (Dict[str, Any]): Redis keys and values to set.
+
+        Returns:
+            bool: Success or not.
+        """
+        if not mapping:
+            return True
+
+        try:
+            async with self.apool.pipeline(transaction = False) as pipe:
+                for key, value in mapping.items():
+                    pipe.set(key, self.codec.encode(value))
+                await pipe.execute()
+        except Exception as e:
+            log.warning(f"Cannot set keys {', '.join(mapping)}; {e}")
+            return False
+        return True
+
+    def hloads(self, key: str) -> Dict[str, Any]:
+        """Get every field of a hash.
+
+        Args:
+            key (str): Redis key.
+
+        Returns:
+            Dict[str, Any]: Fields and values, Empty if the hash doesn't exist.
+        """
+        return {
+            field.decode(): decode(value) for field, value in self.pool.hgetall(key).items()
+        }
+
+    def hdumps(self, key: str, mapping: Dict[str, Any]) -> bool:
+        """Set fields of a hash, Other fields are left untouched.
+
+        Args:
+            key (str): Redis key.
+            mapping (Dict[str, Any]): Fields and values to set.
+
+        Returns:
+            bool: Success or not.
+        """
+        if not mapping:
+            return True
+
+        try:
+            self.pool.hset(key, mapping = {field: self.codec.encode(value) for field, value in mapping.items()})
+        except Exception as e:
+            log.warning(f"Cannot set fields of {key}; {e}")
+            return False
+        return True
+
+    def hdeletes(self, key: str, *fields: str) -> bool:
+        """Delete fields from a hash.
+
+        Args:
+            key (str): Redis key.
+            fields (str): Fields to delete.
+
+        Returns:
+            bool: Success or not.
+        """
+        if not fields:
+            return True
+
+        try:
+            self.pool.hdel(key, *fields)
+        except Exception as e:
+            log.warning(f"Cannot delete fields of {key}; {e}")
+            return False
+        return True
+
+    def renames(self, key: str, new_key: str) -> bool:
+        """Rename a key, Replace new_key if it exists.
+
+        Args:
+            key (str): Redis key.
+            new_key (str): New name of the key.
+
+        Returns:
+            bool: Success or not.
+        """
+        try:
+            self.pool.rename(key, new_key)
+        except Exception as e:
+            log.warning(f"Cannot rename {key} to {new_key}; {e}")
+            return False
+        return True
+
+    async def hload(self, key: str, field: str, backoff: Any = None) -> Any:
+        """(Async) Get a field of a hash. If doesn't exist, return backoff.
+
+        Args:
+            key (str): Redis key.
+            field (str): Hash field.
+            backoff (Any, optional): Backoff value to return. Defaults to None.
+
+        Returns:
+            Any: Value at a field.
+        """
+        ret = await self.apool.hget(key, field)
+
+        if ret is None:
+            return backoff
+        return decode(ret)
+
+    async def hload_all(self, key: str) -> Dict[str, Any]:
+        """(Async) Get every field of a hash.
+
+        Args:
+            key (str): Redis key.
+
+        Returns:
+            Dict[str, Any]: Fields and values, Empty if the hash doesn't exist.
+        """
+        return {
+            field.decode(): decode(value) for field, value in (await self.apool.hgetall(key)).items()
+        }
+
+    async def hdump(self, key: str, mapping: Dict[str, Any]) -> bool:
+        """(Async) Set fields of a hash, Other fields are left untouched.
+
+        Args:
+            key (str): Redis key.
+            mapping (Dict[str, Any]): Fields and values to set.
+
+        Returns:
+            bool: Success or not.
+        """
+        if not mapping:
+            return True
+
+        try:
+            await self.apool.hset(key, mapping = {field: self.codec.encode(value) for field, value in mapping.items()})
+        except Exception as e:
+            log.warning(f"Cannot set fields of {key}; {e}")
+            return False
+        return True
+
+    async def hdelete(self, key: str, *fields: str) -> bool:
+        """(Async) Delete fields from a hash.
+
+        Args:
+            key (str): Redis key.
+            fields (str): Fields to delete.
+
+        Returns:
+            bool: Success or not.
+        """
+        if not fields:
+            return True
+
+        try:
+            await self.apool.hdel(key, *fields)
+        except Exception as e:
+            log.warning(f"Cannot delete fields of {key}; {e}")
+            return False
+        return True
+
+    async def close(self) -> None:
+        """Close all connections in both pools."""
+        await self.apool.close()
+        await self.apool.connection_pool.disconnect()
+        self.pool.close()
 
 
 class ReplitDatabase:
-    def __init__(self):
+    def __init__(self, **kwargs):
+        # Connection options only apply to Redis.
         log.debug("init database succesful")
     
     async def load(self, key: str, go_back: Any = None) -> Any:
@@ -104,6 +421,37 @@ class ReplitDatabase:
             return False
         return True
     
+    async def load_many(self, keys: Iterable[str], go_back: Any = None) -> List[Any]:
+        """ Load multiple keys safely from database. """
+        return [await self.load(key, go_back) for key in keys]
+
+    async def dump_many(self, mapping: Dict[str, Any]) -> bool:
+        """ Dump multiple keys safely to database. """
+        success = True
+        for key, value in mapping.items():
+            success = await self.dump(key, value) and success
+        return success
+
+    async def hload(self, key: str, field: str, go_back: Any = None) -> Any:
+        """ Load a field of a hash safely from database. """
+        return self.hloads(key).get(field, go_back)
+
+    async def hload_all(self, key: str) -> Dict[str, Any]:
+        """ Load every field of a hash safely from database. """
+        return self.hloads(key)
+
+    async def hdump(self, key: str, mapping: Dict[str, Any]) -> bool:
+        """ Dump fields of a hash safely to database. """
+        return self.hdumps(key, mapping)
+
+    async def hdelete(self, key: str, *fields: str) -> bool:
+        """ Delete fields of a hash safely from database. """
+        return self.hdeletes(key, *fields)
+
+    async def close(self) -> None:
+        """ Nothing to close, Replit handles connection itself. """
+        pass
+    
     def loads(self, key: str, go_back: Any = None) -> Optional[Any]:
         """ Load data cautiously from database. """
         try: 
@@ -121,6 +469,37 @@ class ReplitDatabase:
             return False
         return True
     
+    # Replit has no hashes, so a hash is kept as a normal dict under its key.
+    def hloads(self, key: str) -> Dict[str, Any]:
+        """ Load every field of a hash cautiously from database. """
+        try:
+            return dict(replit.db[key])
+        except KeyError:
+            return {}
+
+    def hdumps(self, key: str, mapping: Dict[str, Any]) -> bool:
+        """ Dump fields of a hash cautiously to database. """
+        data = self.hloads(key)
+        data.update(mapping)
+        return self.dumps(key, data)
+
+    def hdeletes(self, key: str, *fields: str) -> bool:
+        """ Delete fields of a hash cautiously from database. """
+        data = self.hloads(key)
+        for field in fields:
+            data.pop(field, None)
+        return self.dumps(key, data)
+
+    def renames(self, key: str, new_key: str) -> bool:
+        """ Rename a key cautiously in database. """
+        try:
+            replit.db[new_key] = replit.db[key]
+            del replit.db[key]
+        except Exception:
+            log.warning(traceback.format_exc())
+            return False
+        return True
+    
 HAS_REPLIT = HAS_REDIS = True
 
 try:
@@ -130,9 +509,25 @@ except (ImportError, ModuleNotFoundError):
 
 try:
     import redis
+    import redis.asyncio as aioredis
 except (ImportError, ModuleNotFoundError):
     HAS_REDIS = False
 
+HAS_ORJSON = HAS_MSGPACK = True
+
+try:
+    import orjson
+except (ImportError, ModuleNotFoundError):
+    HAS_ORJSON = False
+
+try:
+    import msgpack
+except (ImportError, ModuleNotFoundError):
+    HAS_MSGPACK = False
+
+# All codecs that can be used on this machine, by ID.
+CODECS = {codec.id: codec for codec in (PickleCodec(), JsonCodec(), MsgpackCodec()) if codec.id != MsgpackCodec.id or HAS_MSGPACK}
+
 if HAS_REPLIT:
     log.info("Selected: Replit Database")
     Database = ReplitDatabase
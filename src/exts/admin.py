@@ -50,6 +50,12 @@ class AdminCommands(commands.Cog):
     @commands.is_owner()
     async def _restart(self, ctx: commands.Context) -> None:
         await ctx.send("Restarting...")
+        # Music queues continue after restarting, With the current positions.
+        music = self.bot.get_cog("Music")
+        if music is not None:
+            music.mark_queues(force = True)
+        # Restarting replaces the process, Don't lose unsaved changes.
+        await self.bot.persist.flush()
         self.bot.restart()
 
         
@@ -1,52 +1,86 @@
 """
 A Day detection system, Use to check new day.
+Sleeps until the next midnight (UTC+1 or UTC+7) instead of checking every minute.
 Made by Tpmonkey
 """
 
-from discord.ext import tasks
 from discord.ext.commands import Cog, Context, command
 
 import config
 from bot import Bot
 from utils.time import today, today_th
 
+import asyncio
 import logging
+import datetime
 import traceback
 
 log = logging.getLogger(__name__)
 
-MINUTES = config.check_day_cooldown
+# Time zones (hours) that have their own new day event.
+OFFSETS = (1, 7)
+RESYNC = config.day_resync * 60
 
 class DayLoop(Cog):
     def __init__(self, bot: Bot):
         self.bot = bot
         self.today_morning = None
         self.today_th = None
-        self.loop.start()
+        self.next_check = None
+        self.task = self.bot.loop.create_task(self.loop())
 
     async def cog_unload(self) -> None:
-        self.loop.stop()     
+        self.task.cancel()
 
     @Cog.listener()
     async def on_resumed(self) -> None:
         """
         Check if loop running correctly.
         """
-        if not self.loop.is_running():
-            self.loop.restart()
+        if self.task.done():
+            self.task = self.bot.loop.create_task(self.loop())
             await self.bot.log(__name__, "DayLoop is not running, Restarted", True)
             await self.bot.log(__name__, traceback.format_exc())                
+
+    @staticmethod
+    def next_midnight(offset: int) -> datetime.datetime:
+        """ Next midnight in UTC+offset, Returned in UTC. """
+        now = datetime.datetime.utcnow() + datetime.timedelta(hours=offset)
+        midnight = datetime.datetime.combine(now.date() + datetime.timedelta(days=1), datetime.time())
+        return midnight - datetime.timedelta(hours=offset)
+
+    @staticmethod
+    async def sleep_until(when: datetime.datetime) -> None:
+        """
+        Sleep until given UTC time.
+        asyncio sleeps on a monotonic clock which may drift from the wall clock,
+        and stops while the machine is suspended. So wake up at least every RESYNC to check again.
+        """
+        while True:
+            remaining = (when - datetime.datetime.utcnow()).total_seconds()
+            if remaining <= 0:
+                return
+            await asyncio.sleep(min(remaining, RESYNC))
     
-    @tasks.loop(minutes=MINUTES)
     async def loop(self) -> None:
         await self.bot.wait_until_ready()
         
-        if self.today_morning is None:  
-            self.today_morning = await self.bot.database.load("TODAY")
-
-        if self.today_th is None:  
-            self.today_th = await self.bot.database.load("TODAY-TH")
-        
+        # Catch up, New day may have passed while the bot was offline.
+        self.today_morning, self.today_th = await self.bot.database.load_many(("TODAY", "TODAY-TH"))
+
+        while True:
+            try:
+                await self.check()
+            except Exception:
+                log.error(traceback.format_exc())
+                await self.bot.log(__name__, f"Unable to process new day\n```py\n{traceback.format_exc()[-1500:]}\n```", True)
+
+            self.next_check = min(self.next_midnight(offset) for offset in OFFSETS)
+            log.debug(f"next new day check at {self.next_check} UTC")
+            await self.sleep_until(self.next_check)
+
+    async def check(self) -> None:
+        """ Check if the date same as in database, Trigger new day events if not. """
         today_new = today()
 
         # Check if the date same as in database.
@@ -6,6 +6,7 @@ from bot import Bot
 import os
 import json
 import psutil
+import asyncio
 import logging
 from datetime import datetime
 
@@ -30,11 +31,69 @@ class Debug(Cog):
         if cog is None:
             return await ctx.send("Music cog is not loaded or The name has been changed.")
         
+        from utils.audio import INFO_CACHE
+        stats = INFO_CACHE.stats()
+
         text = f"Total of {len(cog.voice_states)}\n"
         text += "\n".join([str(i) for i in cog.voice_states])
+        text += (
+            f"\n\nInfo cache: {stats['entries']} tracks, {stats['bytes'] / 2**20:.2f}/{self.bot.config.music_info_cache} MB"
+            f"\nhits: {stats['hits']}, misses: {stats['misses']}, evictions: {stats['evictions']}"
+        )
+        from utils.audio import AUDIO_CACHE
+        if AUDIO_CACHE is not None:
+            stats = AUDIO_CACHE.stats()
+            text += (
+                f"\nDisk cache: {stats['entries']} tracks, {stats['bytes'] / 2**20:.1f}/{self.bot.config.audio_cache_size} MB"
+                f"\nhits: {stats['hits']}, misses: {stats['misses']}, caching: {stats['storing']}"
+            )
+
+        text += "\n\n" + await self.stream_usage(cog)
+
+        from utils.audioworker import get_pool
+        pool = get_pool()
+        if pool is not None:
+            for stats in pool.stats():
+                try:
+                    cpu = psutil.Process(stats['pid']).cpu_percent(0.1)
+                except psutil.NoSuchProcess:
+                    cpu = 0
+                text += (
+                    f"\nWorker {stats['index']} (pid {stats['pid']}): {stats['streams']} streams, {cpu:.1f}% CPU"
+                    f", {stats['frames']} frames, {stats['restarts']} restarts"
+                )
 
         await ctx.send(text)
     
+    @staticmethod
+    async def stream_usage(cog) -> str:
+        """CPU usage of every playing stream (ffmpeg) and the bot process, Measured over a second."""
+        bot_process = psutil.Process(os.getpid())
+        processes = {}
+        for gid, state in cog.voice_states.items():
+            source = getattr(state.current, "source", None)
+            if source is None or source.process is None:
+                continue
+            try:
+                processes[gid] = (source.mode, psutil.Process(source.process.pid))
+            except psutil.NoSuchProcess:
+                pass
+        
+        # First call only starts measuring.
+        bot_process.cpu_percent(None)
+        for _, process in processes.values():
+            process.cpu_percent(None)
+        await asyncio.sleep(1)
+
+        lines = [f"Bot process: {bot_process.cpu_percent(None):.1f}% CPU (opus encoding of PCM streams is here)"]
+        for gid, (mode, process) in processes.items():
+            try:
+                lines.append(f"{gid}: {mode}, ffmpeg {process.cpu_percent(None):.1f}% CPU")
+            except psutil.NoSuchProcess:
+                lines.append(f"{gid}: {mode}, ended")
+        
+        return "\n".join(lines)
+
     @command(hidden=True)
     @guild_only()
     async def debug(self, ctx: Context) -> None:
@@ -71,9 +130,27 @@ class Debug(Cog):
         if update_last is not None: 
             update_last = datetime.utcnow() - update_last
         
+        updater = self.bot.get_cog("Updater")
+        update_latency = None
+        update_cache = None
+        if updater is not None:
+            update_cache = f"{updater.hits} hits, {updater.misses} misses"
+            if str(ctx.guild.id) in updater.latency:
+                update_latency = f"{updater.latency[str(ctx.guild.id)]:.2f}s"
+
         embed.add_field(
             name="Time",
-            value = f"kus-news: {kus_last}/{self.bot.config.kus_news_cooldown}\nupdate: {update_last}/{self.bot.config.update_work_cooldown}",
+            value = f"kus-news: {kus_last}/{self.bot.config.kus_news_cooldown}\nupdate: {update_last}/{self.bot.config.update_work_cooldown}"
+            f"\nupdate latency: {update_latency}\nmessage cache: {update_cache}",
+            inline=False
+        )
+
+        # Database
+        stats = self.bot.persist.stats()
+        embed.add_field(
+            name="Database",
+            value = f"pending: {stats['pending']}\nflushes: {stats['flushes']} ({stats['writes']} writes)"
+            f"\nlatency: {stats['last_latency']:.4f}s (max {stats['max_latency']:.4f}s)",
             inline=False
         )
 
@@ -102,5 +179,16 @@ class Debug(Cog):
         json.dump(work, open("evals/work_debug.json", "w"), indent=2)
         await ctx.send(file=File("evals/work_debug.json"))
 
+    @command(hidden=True)
+    @is_owner()
+    async def deadlines(self, ctx: Context, amount: int = 10) -> None:
+        """Upcoming assignment state changes."""
+        upcoming = self.bot.planner.upcoming(max(min(amount, 30), 1))
+        if not upcoming:
+            return await ctx.send("Nothing is scheduled.")
+
+        text = "\n".join(f"`{due:%d-%m-%Y}` {name} `{key}` ({guild_id})" for due, name, guild_id, key in upcoming)
+        await ctx.send(text)
+
 async def setup(bot: Bot) -> None:
     await bot.add_cog(Debug(bot))
\ No newline at end of file
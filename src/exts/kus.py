@@ -37,8 +37,8 @@ class NewsManager:
         self.bot = bot
         self.news = list(bot.database.loads("NEWS-IDS", []))
     
-    def save(self) -> None:
-        self.bot.database.dumps("NEWS-IDS", self.news)
+    async def save(self) -> None:
+        await self.bot.database.dump("NEWS-IDS", self.news)
     
     def extend(self, title: str) -> None:
         hash_title = hash(title)
@@ -49,11 +49,11 @@ class NewsManager:
         if len(self.news) > 20:
             del self.news[0]
     
-    def pop(self, times: int) -> None:
+    async def pop(self, times: int) -> None:
         for _ in range(times):
             self.news.pop(0)
         
-        self.save()
+        await self.save()
         
     def compare(self, new_news: list) -> list:
         """Compare new and old news to find a new news.
@@ -166,7 +166,7 @@ class KUSNews(Cog):
                 await self.bot.log(__name__, f"Canceling: Too many news, Something may went wrong ({len(news)} news).", True)
                 self.sendEmbed = False
             else:
-                self.manager.save()
+                await self.manager.save()
             
             # Format from [(title, url, image, id), ...] to [(title, url, image)]
             # But convert the image from gif to image.
@@ -9,19 +9,18 @@ Re-written by Tpmonkey.
 import asyncio
 import datetime
 import enum
-import itertools
 import logging
 import math
-import random
 import re
 import time
 import traceback
-from typing import Optional
+from typing import AsyncIterator, List, Optional
 
 import discord
-from async_timeout import timeout
 from discord.ext import commands, tasks
 
+import config
+
 if not discord.opus.is_loaded():
     import ctypes
     discord.opus.load_opus(ctypes.util.find_library("opus"))
@@ -29,10 +28,16 @@ if not discord.opus.is_loaded():
 # Audio system (Youtube DL & Spotipy)
 from utils.audio import *
 from utils.spotify import *
+from utils.audioworker import start_pool, stop_pool
+from utils.chunkedlist import ChunkedList
 
 log = logging.getLogger(__name__)
 
 # https://stackoverflow.com/questions/19377262/regex-for-youtube-url
+SEARCH_CACHE_KEY = "SEARCH-CACHE"
+# Hash, guild ID: VoiceState.snapshot
+QUEUES_KEY = "MUSIC-QUEUES"
+
 YOUTUBE_REGEX = r"^((?:https?:)?\/\/)?((?:www|m)\.)?((?:youtube(-nocookie)?\.com|youtu.be))(\/(?:[\w\-]+\?v=|embed\/|v\/)?)([\w\-]+)(\S+)?$"
 
 
@@ -50,39 +55,99 @@ class Song:
     """A class containing Youtube video data.
     """
 
-    __slots__ = "url", "title", "ctx", "requester", "source"
+    # Only IDs are kept, Holding the context would keep its message, channel and guild alive for every queued track.
+    __slots__ = "url", "title", "requester_id", "channel_id", "source", "info", "prefetch"
 
-    def __init__(self, url: str, ctx: commands.Context, title: Optional[str] = None):
+    def __init__(self, url: str, requester_id: int, channel_id: int, title: Optional[str] = None):
         self.url = url
         self.title = title
 
-        self.ctx = ctx
-        self.requester = ctx.author
+        self.requester_id = requester_id
+        self.channel_id = channel_id
 
         self.source = None
+        # Resolved stream info and the task resolving it, see VoiceState.lookahead
+        self.info = None
+        self.prefetch = None
+
+    @classmethod
+    def from_ctx(cls, url: str, ctx: commands.Context, title: Optional[str] = None) -> "Song":
+        return cls(url, ctx.author.id, ctx.channel.id, title)
+
+    def dump(self) -> list:
+        """Compact form for queue snapshots, see Song.load"""
+        return [self.url, self.title, self.requester_id, self.channel_id]
+
+    @classmethod
+    def load(cls, data: list) -> "Song":
+        url, title, requester_id, channel_id = data
+        return cls(url, requester_id, channel_id, title)
+
+    @property
+    def requester(self) -> str:
+        # Mention works without fetching the member.
+        return f"<@{self.requester_id}>"
 
-    async def load_audio(self, speed: float = 1, pitch: float = 1) -> YTDLSource:
+    async def fetch_info(self, music: "Music") -> dict:
         if self.title is None and not "http" in self.url:
             # | commit `ca1f719ca0ccad3f010fd4229a1f5f134831b10f`
             # | attempt to fix error in spotify playlist
             # v but searching using link is effected... (fixed 7/5/2022)
             # Youtube-dl thought it was an url and then commit suicide. (3/5/2022)
             self.url = self.url.replace(":", "")
-            self.search()
+            await self.search(music)
 
-        self.source = await YTDLSource.create_source(self.url, speed=speed, pitch=pitch)
+        self.info = await YTDLSource.extract_info(self.url)
+        return self.info
+
+    def start_prefetch(self, music: "Music") -> None:
+        # Resolve in the background, load_audio will pick it up.
+        if self.info is None and self.prefetch is None:
+            self.prefetch = asyncio.get_event_loop().create_task(self.fetch_info(music))
+
+    def cancel_prefetch(self) -> None:
+        if self.prefetch is not None:
+            self.prefetch.cancel()
+            self.prefetch = None
+        # Stream url expires, resolve it again when needed.
+        self.info = None
+
+    async def load_audio(self, music: "Music", speed: float = 1, pitch: float = 1, volume: float = DEFAULT_VOLUME, start: float = 0) -> YTDLSource:
+        # Last play (loop) isn't the position of this one.
+        self.source = None
+        try:
+            if self.prefetch is not None:
+                info = await self.prefetch
+            else:
+                info = self.info or await self.fetch_info(music)
+
+            # Waited in queue (long track, paused) longer than the stream url lasts.
+            if isStreamExpired(info):
+                log.debug(f"Stream of {self.url} expired, resolving again")
+                INFO_CACHE.pop(info.get("id"))
+                info = await self.fetch_info(music)
+        finally:
+            self.prefetch = None
+            # Only use it once, next play will resolve it again.
+            self.info = None
+
+        self.source = YTDLSource.from_info(info, speed=speed, pitch=pitch, volume=volume, start=start)
         return self.source
 
-    def search(self) -> None:
-        if self.ctx.cog.api_error or self.title is not None:
+    async def search(self, music: "Music") -> None:
+        if music.api_error or self.title is not None:
             return
 
         try:
             log.debug(f"Searching {self.url}")
-            ret = getInfo(self.url)
+            ret = await fetchInfo(self.url)
+        except asyncio.TimeoutError:
+            # API is slow, not out of quota. yt-dlp will search it instead.
+            log.warning(f"Searching {self.url} timed out")
+            return
         except Exception:
             log.error(traceback.format_exc())
-            self.ctx.cog.play_error()
+            music.play_error()
             return
 
         self.url = f"https://www.youtube.com/watch?v={ret['id']['videoId']}"
@@ -101,7 +166,7 @@ class Song:
         )
 
         embed.add_field(name='Duration', value=self.source.duration)
-        embed.add_field(name='Requested by', value=self.requester.mention)
+        embed.add_field(name='Requested by', value=self.requester)
 
         embed.set_thumbnail(url=self.source.thumbnail)
         embed.set_footer(text="Use ,p <song> to add more!")
@@ -110,9 +175,22 @@ class Song:
 
 
 class SongQueue(asyncio.Queue):
+    # Store songs in a ChunkedList instead of a deque,
+    # So long queues (Spotify playlists) don't shift every track on remove/move.
+    def _init(self, maxsize):
+        self._queue = ChunkedList()
+        # Bumped on every change, So unchanged queues aren't snapshotted again.
+        self.version = 0
+
+    def _put(self, item):
+        self.version += 1
+        self._queue.append(item)
+
+    def _get(self):
+        self.version += 1
+        return self._queue.popleft()
+
     def __getitem__(self, item):
-        if isinstance(item, slice):
-            return list(itertools.islice(self._queue, item.start, item.stop, item.step))
         return self._queue[item]
 
     def __iter__(self):
@@ -122,20 +200,41 @@ class SongQueue(asyncio.Queue):
         return self.qsize()
 
     def clear(self):
+        for song in self._queue:
+            song.cancel_prefetch()
         self._queue.clear()
+        self.version += 1
 
     def shuffle(self):
-        random.shuffle(self._queue)
+        self._queue.shuffle()
+        self.version += 1
 
     def remove(self, index: int):
-        del self._queue[index]
+        self._queue.pop(index).cancel_prefetch()
+        self.version += 1
+
+    def move(self, source: int, destination: int):
+        self.version += 1
+        return self._queue.move(source, destination)
+
+    def skipto(self, index: int):
+        # Skipped tracks go to the end of the queue.
+        self._queue.rotate(-index)
+        self.version += 1
+
+    def put_first(self, item):
+        # put_nowait() wakes up the player if it's waiting for a track.
+        self.put_nowait(item)
+        self._queue.move(-1, 0)
 
 
 class VoiceState:
-    def __init__(self, bot: commands.Bot, ctx: commands.Context):
-        log.debug(f"VoiceState created for {ctx.guild.id}")
+    def __init__(self, bot: commands.Bot, guild_id: int, channel_id: int):
+        log.debug(f"VoiceState created for {guild_id}")
         self.bot = bot
-        self._ctx = ctx
+        self.guild_id = guild_id
+        # Text channel to announce in.
+        self.channel_id = channel_id
 
         self.current = None
         self.voice = None
@@ -147,13 +246,66 @@ class VoiceState:
         self.loading = False
         self.nightcore = {"speed": 1, "pitch": 1}
         self._loop = Loop.NONE
-        self._volume = 0.5
+        self._volume = DEFAULT_VOLUME
         self.skip_votes = set()
 
         self.playing = False
         self.terminate = False
         # bot.loop.create_task(self.audio_player_task())
         self.audio_player = None
+        # Songs being resolved ahead of time.
+        self.prefetching = set()
+        # Where to start the next track, Set when restored from a snapshot.
+        self.seek = 0
+        # State of the last snapshot, see Music.mark_queues
+        self.saved = None
+
+    @classmethod
+    def from_snapshot(cls, bot: commands.Bot, guild_id: int, data: dict):
+        """Rebuild the queue from VoiceState.snapshot, The first track continues where it was."""
+        state = cls(bot, guild_id, data["text"])
+        for song in data["songs"]:
+            state.songs.put_nowait(Song.load(song))
+
+        state.seek = data["position"]
+        state._loop = Loop(data["loop"])
+        state.set_nightcore(*data["effect"])
+        state._volume = data["volume"]
+        state.super_shuffle = data["shuffle"]
+        return state
+
+    def snapshot(self) -> dict:
+        """Compact form of the queue and settings, Current track comes first."""
+        songs = [song.dump() for song in self.songs]
+        position = 0
+        if self.current is not None:
+            songs.insert(0, self.current.dump())
+            # Still loading, It will start at seek.
+            position = self.seek if self.current.source is None else round(self.current.source.position, 2)
+
+        return {
+            "voice": self.voice.channel.id,
+            "text": self.channel_id,
+            "songs": songs,
+            "position": position,
+            "loop": self._loop.value,
+            "effect": [self.nightcore["speed"], self.nightcore["pitch"]],
+            "volume": self._volume,
+            "shuffle": self.super_shuffle
+        }
+
+    def snapshot_key(self) -> tuple:
+        """Changes when the snapshot would, Except for the playing position."""
+        return (
+            self.songs.version, id(self.current), self.voice.channel.id if self.voice else None,
+            self._loop, self.nightcore["speed"], self.nightcore["pitch"], self._volume, self.super_shuffle
+        )
+
+    async def send(self, *args, **kwargs) -> Optional[discord.Message]:
+        channel = self.bot.get_channel(self.channel_id)
+        if channel is None:
+            return None
+        return await channel.send(*args, **kwargs)
 
     def __del__(self):
         if self.audio_player is not None:
@@ -175,6 +327,10 @@ class VoiceState:
     def volume(self, value: float):
         self._volume = value
 
+    @property
+    def music(self):
+        return self.bot.get_cog("Music")
+
     @property
     def is_playing(self):
         return self.voice and self.current
@@ -184,10 +340,26 @@ class VoiceState:
         if self.audio_player is None:
             self.audio_player = self.bot.loop.create_task(
                 self.audio_player_task())
+        self.lookahead()
+
+    def lookahead(self):
+        """Resolve the next tracks in the background, so track changes are gapless.
+        Call it again after the queue is reordered, tracks out of range will be cancelled.
+        """
+        upcoming = set(self.songs[:config.music_prefetch])
+        if self._loop == Loop.SINGLE and self.current is not None:
+            upcoming = {self.current}
+
+        for song in self.prefetching - upcoming:
+            song.cancel_prefetch()
+        for song in upcoming:
+            song.start_prefetch(self.music)
+
+        self.prefetching = upcoming
 
     async def audio_player_task(self):
         # Note: This is madness. Who ever try to read this, Good luck.
-        log.info(f"Audio Player Launched for {self._ctx.guild.id}")
+        log.info(f"Audio Player Launched for {self.guild_id}")
         while True:
             self.next.clear()
 
@@ -202,13 +374,12 @@ class VoiceState:
                 # the player will disconnect due to performance reasons.
                 self.current = None
 
+                music = self.music
+                music.schedule_disconnect(self.guild_id, "empty", self.bot.msettings.get(self.guild_id, "timeout"))
                 try:
-                    async with timeout(self.bot.msettings.get(self._ctx.guild.id, "timeout")):
-                        self.current = await self.songs.get()
-
-                except asyncio.TimeoutError:
-                    log.debug(f"{self._ctx.guild.id}: No more track, stopping")
-                    return self.bot.loop.create_task(self.stop())
+                    self.current = await self.songs.get()
+                finally:
+                    music.cancel_disconnect(self.guild_id, "empty")
 
             else:  # Either loop one of loop queue is on.
                 if self._loop == Loop.SINGLE:
@@ -219,10 +390,14 @@ class VoiceState:
 
             try:
                 self.loading = True
-                source = await self.current.load_audio(self.nightcore["speed"], self.nightcore["pitch"])
+                # It's playing now, lookahead shouldn't cancel it.
+                self.prefetching.discard(self.current)
+                source = await self.current.load_audio(
+                    self.music, self.nightcore["speed"], self.nightcore["pitch"], self._volume, self.seek
+                )
 
             except Exception as e:
-                await self._ctx.send(
+                await self.send(
                     embed=discord.Embed(
                         description=self.current.url,
                         colour=discord.Colour.dark_red(),
@@ -236,19 +411,18 @@ class VoiceState:
                 continue
             finally:
                 self.loading = False
+                self.seek = 0
 
             # super shuffle.
             if self.super_shuffle:
                 self.songs.shuffle()
 
-            # Set the volume, that nobody cares and play it
-            await asyncio.sleep(1)
-            self.current.source.volume = self._volume
             self.voice.play(source, after=self.play_next_song)
+            self.lookahead()
 
             # If option "annouce next song" is on, annouce it
-            if self.bot.msettings.get(self._ctx.guild.id, "annouce_next_song"):
-                self.announce_message = await self._ctx.send(embed=self.current.create_embed())
+            if self.bot.msettings.get(self.guild_id, "annouce_next_song"):
+                self.announce_message = await self.send(embed=self.current.create_embed())
 
             await self.next.wait()
 
@@ -276,6 +450,9 @@ class VoiceState:
             return
 
         self.songs.clear()
+        for song in self.prefetching:
+            song.cancel_prefetch()
+        self.prefetching.clear()
 
         if self.audio_player is not None:
             self.audio_player.cancel()
@@ -296,9 +473,9 @@ class VoiceState:
         # Delete the reference
         cog = self.bot.get_cog("Music")
         if cog is not None:
-            cog.remove_voicestate(self._ctx.guild.id)
+            cog.remove_voicestate(self.guild_id)
 
-        log.info(f"{self._ctx.guild.id}: Left vc & cleaned up")
+        log.info(f"{self.guild_id}: Left vc & cleaned up")
 
 
 class Music(commands.Cog):
@@ -317,21 +494,57 @@ class Music(commands.Cog):
         # It will also disable it untils next restart.
         self.api_error = False
 
-        # disconnecting when bot is alone, what a sad life.
-        self.wait_for_disconnect = {}
-        self.loop_for_deletion.start()
+        # Search cache misses on last save.
+        self._search_misses = 0
+        # Queue titles being searched.
+        self.title_tasks = set()
+
+        # disconnecting when bot is alone or queue is empty, what a sad life.
+        # guild ID: {reason: TimerHandle}
+        self.idle = {}
+
+        # Queues are kept for the next load, instead of deleted.
+        self.unloading = False
+
+    async def cog_load(self) -> None:
+        # Youtube API results from before restarting, save some quota.
+        data = await self.bot.database.load(SEARCH_CACHE_KEY, {})
+        getInfo.load(data.get("info", []))
+        getYtPlaylist.load(data.get("playlist", []))
+        log.debug(f"Loaded {len(getInfo.cache)} searches and {len(getYtPlaylist.cache)} playlists from cache")
+
+        self.save_search_cache.start()
+
+        if config.audio_workers > 0:
+            start_pool(config.audio_workers)
+
+        self.bot.loop.create_task(self.restore_queues())
+        self.save_queues.start()
 
     async def cog_unload(self) -> None:
         # when cog is unload (normally to reload command bc replit sucks)
         # stop all the loop and disconnect the bot from all vcs
         log.info("Unloading Cog")
-        self.loop_for_deletion.stop()
-        for state in self.voice_states.values():
-            self.bot.loop.create_task(state.stop())
+        self.unloading = True
+        self.save_search_cache.cancel()
+        self.mark_search_cache()
+        # Before anything stops, So tracks continue where they were.
+        self.save_queues.cancel()
+        self.mark_queues(force=True)
+        # Tracks on workers end with them.
+        await stop_pool()
+        # Wait for disconnecting, The next load will connect again.
+        await asyncio.gather(*(state.stop() for state in list(self.voice_states.values())))
+        # The next load reads snapshots right away, They have to be written by then.
+        await self.bot.persist.flush()
 
     def remove_voicestate(self, key: int) -> None:
         self.voice_states.pop(key, None)
-        self.wait_for_disconnect.pop(key, None)
+        for handle in self.idle.pop(key, {}).values():
+            handle.cancel()
+
+        if not self.unloading:
+            self.bot.persist.mark_field(QUEUES_KEY, key, None)
 
     def play_error(self) -> bool:
         self.api_error = True
@@ -341,7 +554,7 @@ class Music(commands.Cog):
         # Get voice state and embeded it to context.
         state = self.voice_states.get(ctx.guild.id)
         if not state:
-            state = VoiceState(self.bot, ctx)
+            state = VoiceState(self.bot, ctx.guild.id, ctx.channel.id)
             self.voice_states[ctx.guild.id] = state
         return state
 
@@ -359,24 +572,96 @@ class Music(commands.Cog):
         log.error(traceback.format_exc())
         await ctx.send(':x: **An error occurred:** {}'.format(str(error)))
 
-    @tasks.loop(minutes=2)
-    async def loop_for_deletion(self) -> None:
-        # TODO: Use schedule task.
+    def mark_search_cache(self) -> None:
+        self.bot.persist.mark(SEARCH_CACHE_KEY, {"info": getInfo.dump(), "playlist": getYtPlaylist.dump()})
 
-        copy = self.wait_for_disconnect.copy()
-        for gid in copy.keys():
-            if time.time() >= self.wait_for_disconnect[gid]:
-                log.info(f"{gid}: Timeout, Nobody left in vc... Disconnected")
-                # Remove from current dict, But need to avoid RuntimeError
+    def mark_queues(self, force: bool = False) -> None:
+        """Snapshot queues changed since the last time, Written by the write-behind."""
+        for gid, state in self.voice_states.items():
+            if state.voice is None or state.terminate:
+                continue
 
-                # Leave channel & Clean up
-                try:
-                    await self.voice_states[gid].stop()
-                except KeyError:
-                    log.debug(
-                        f"{gid}: Attempted to disconnect but already disconnected.")
-                else:
-                    log.info(f"{gid}: Successfully disconnected")
+            key = state.snapshot_key()
+            if force or key != state.saved:
+                state.saved = key
+                self.bot.persist.mark_field(QUEUES_KEY, gid, state.snapshot())
+
+    @tasks.loop(seconds=config.music_snapshot_interval)
+    async def save_queues(self) -> None:
+        self.mark_queues()
+
+    async def restore_queues(self) -> None:
+        """Continue queues from before restarting or reloading."""
+        await self.bot.wait_until_ready()
+        snapshots = await self.bot.database.hload_all(QUEUES_KEY)
+        if snapshots:
+            log.info(f"Restoring {len(snapshots)} queues")
+
+        await asyncio.gather(*(self.restore_queue(int(gid), data) for gid, data in snapshots.items()))
+
+    async def restore_queue(self, gid: int, data: dict) -> None:
+        if gid in self.voice_states:
+            return
+
+        channel = self.bot.get_channel(data["voice"])
+        # Nobody to play for, or nothing to play.
+        if channel is None or not data["songs"] or not any(not member.bot for member in channel.members):
+            log.debug(f"{gid}: Dropped queue snapshot")
+            self.bot.persist.mark_field(QUEUES_KEY, gid, None)
+            return
+
+        state = VoiceState.from_snapshot(self.bot, gid, data)
+        self.voice_states[gid] = state
+        try:
+            state.voice = await channel.connect()
+        except (discord.ClientException, asyncio.TimeoutError) as e:
+            log.warning(f"{gid}: Unable to restore queue; {e}")
+            self.voice_states.pop(gid, None)
+            return
+
+        state.start_player()
+        log.info(f"{gid}: Restored {len(state.songs)} tracks")
+
+    @commands.Cog.listener()
+    async def on_ready(self) -> None:
+        # Reconnected to Discord, Guilds that lost their player get it back.
+        await self.restore_queues()
+
+    @tasks.loop(minutes=10)
+    async def save_search_cache(self) -> None:
+        # Only save when something new was searched.
+        misses = getInfo.cache.misses + getYtPlaylist.cache.misses
+        if misses != self._search_misses:
+            self._search_misses = misses
+            self.mark_search_cache()
+
+    def schedule_disconnect(self, gid: int, reason: str, delay: float) -> None:
+        """ Disconnect from the guild after delay seconds, unless cancelled. Rescheduling the same reason restarts it. """
+        self.cancel_disconnect(gid, reason)
+        self.idle.setdefault(gid, {})[reason] = self.bot.loop.call_later(delay, self._idle_timeout, gid, reason)
+
+    def cancel_disconnect(self, gid: int, reason: str) -> bool:
+        """ Cancel scheduled disconnect, Return True if there was one. """
+        handles = self.idle.get(gid, {})
+        handle = handles.pop(reason, None)
+        if not handles:
+            self.idle.pop(gid, None)
+        if handle is None:
+            return False
+
+        handle.cancel()
+        return True
+
+    def _idle_timeout(self, gid: int, reason: str) -> None:
+        self.idle.get(gid, {}).pop(reason, None)
+
+        state = self.voice_states.get(gid)
+        if state is None:
+            log.debug(f"{gid}: Attempted to disconnect but already disconnected.")
+            return
+
+        log.info(f"{gid}: Timeout ({reason}), Disconnected")
+        self.bot.loop.create_task(state.stop())
 
     @commands.Cog.listener()
     async def on_voice_state_update(self, member: discord.Member, before: discord.VoiceState, after: discord.VoiceState) -> None:
@@ -410,7 +695,7 @@ class Music(commands.Cog):
                 return
 
             # Remove bot timeout, so it won't disconnect.
-            if self.wait_for_disconnect.pop(member.guild.id, None) is not None:
+            if self.cancel_disconnect(member.guild.id, "alone"):
                 log.info(
                     f"{member.guild.id}: User joined back, Stopping deletion"
                 )
@@ -428,8 +713,8 @@ class Music(commands.Cog):
                 log.info(
                     f"{member.guild.id}: All user left, Waiting for deletion"
                 )
-                self.wait_for_disconnect[member.guild.id] = time.time() + \
-                    self.bot.msettings.get(member.guild.id, "timeout")
+                self.schedule_disconnect(
+                    member.guild.id, "alone", self.bot.msettings.get(member.guild.id, "timeout"))
 
         # Switch vc.
         elif (before.channel is not None and after.channel is not None) and (before.channel.id != after.channel.id):
@@ -448,14 +733,14 @@ class Music(commands.Cog):
                 log.info(
                     f"{member.guild.id}: All user left, Waiting for deletion"
                 )
-                self.wait_for_disconnect[member.guild.id] = time.time() + \
-                    self.bot.msettings.get(member.guild.id, "timeout")
+                self.schedule_disconnect(
+                    member.guild.id, "alone", self.bot.msettings.get(member.guild.id, "timeout"))
                 return
 
             # Switch in, back with bot.
             after_members = [i.id for i in after.channel.members]
             if self.bot.user.id in after_members and member.id in after_members:
-                if self.wait_for_disconnect.pop(member.guild.id, None) is not None:
+                if self.cancel_disconnect(member.guild.id, "alone"):
                     log.info(
                         f"{member.guild.id}: User joined back, Stopping deletion"
                     )
@@ -563,11 +848,12 @@ class Music(commands.Cog):
             return await ctx.send(':x: **Volume must be between `0` and `100`**')
 
         ctx.voice_state.volume = volume / 100
-        try:  # try to change the current song, but the track maybe loading...
-            ctx.voice_state.current.source.volume = volume / 100
-        except AttributeError:
-            pass
+        source = ctx.voice_state.current.source
+        # Track maybe loading, or volume is done by ffmpeg.
+        if source is None or not source.adjustable:
+            return await ctx.send('Volume of the player set to **{}%**\nVolume will be apply on the next song!'.format(volume))
 
+        source.volume = volume / 100
         await ctx.send('Volume of the player set to **{}%**'.format(volume))
 
     @commands.command(name='now', aliases=['current', 'playing'])
@@ -633,7 +919,7 @@ class Music(commands.Cog):
         voter = ctx.message.author
 
         # check if the person who voted is the requester or the setting "vote skip" is turned off.
-        if voter == ctx.voice_state.current.requester or not self.bot.msettings.get(ctx.guild.id, "vote_skip"):
+        if voter.id == ctx.voice_state.current.requester_id or not self.bot.msettings.get(ctx.guild.id, "vote_skip"):
             await ctx.message.add_reaction('⏭')
             ctx.voice_state.skip()
 
@@ -663,12 +949,8 @@ class Music(commands.Cog):
         if len(ctx.voice_state.songs) < 2:
             return await ctx.send("You need at least 2 tracks in queue to use this command!")
 
-        # to work around the "asyncio.Queue" we need to dig deep into the actual code itself.
-        # from https://github.com/python/cpython/blob/main/Lib/asyncio/queues.py#L48
-        # I found out that the queue is based on `collections.deque()` so I access the attribute directly and use its method.
-        # from https://docs.python.org/3/library/collections.html#collections.deque
-        # <- quick math time (?)
-        ctx.voice_state.songs._queue.rotate(-(index-1))
+        ctx.voice_state.songs.skipto(index - 1)
+        ctx.voice_state.lookahead()
 
         # skip the current one
         ctx.voice_state.skip()
@@ -684,15 +966,6 @@ class Music(commands.Cog):
         if len(ctx.voice_state.songs) == 0 and ctx.voice_state.current is None:
             return await ctx.send('Empty queue. ¯\_(ツ)_/¯')
 
-        if ctx.voice_state.loading:
-            m = await ctx.send("Song is currently loading...")
-
-            while ctx.voice_state.loading:
-                # Wait until finished, and continue
-                await asyncio.sleep(0.5)
-
-            await m.delete()
-
         items_per_page = 8
         # use max to prevent 1/0 page
         pages = max(1, math.ceil(len(ctx.voice_state.songs) / items_per_page))
@@ -706,20 +979,13 @@ class Music(commands.Cog):
         start = (page - 1) * items_per_page
         end = start + items_per_page
 
-        # Search up the song first.
-        for song in ctx.voice_state.songs[start:end]:
-            song.search()
-
-        # Got removed, SSL Error.
-        # future_search = {POOL.submit(song.search): song for i, song in enumerate(ctx.voice_state.songs[start:end], start=start)}
-        #
-        # try:
-        #     for _ in as_completed(future_search, timeout = 1):
-        #         # Skip task if it's unfinished
-        #         pass
-        # except TimeoutError as e: # from concurrent lib, not asyncio
-        #     # Ignore the error.
-        #     log.warning(f"{ctx.guild.id}: Queue command raised {e}")
+        # Search up this page, and the next page for when they ask for it.
+        searching = self.resolve_titles(ctx.voice_state.songs[start:end])
+        self.resolve_titles(ctx.voice_state.songs[end:end + items_per_page])
+
+        if searching:
+            # Anything slower will show up next time.
+            await asyncio.wait(searching, timeout=config.music_queue_deadline)
 
         queue = ''
         for i, song in enumerate(ctx.voice_state.songs[start:end], start=start):
@@ -754,9 +1020,13 @@ class Music(commands.Cog):
         # check if it's currently playing something.
         if ctx.voice_state.current is not None:
             current = ctx.voice_state.current
+            if current.source is None or ctx.voice_state.loading:
+                value = f"{current.title or current.url} (loading...)"
+            else:
+                value = f"[{current.source.title}]({current.source.url})"
             embed.add_field(
                 name="Current:",
-                value=f"[{current.source.title}]({current.source.url})",
+                value=value,
                 inline=False
             )
         else:
@@ -765,6 +1035,20 @@ class Music(commands.Cog):
 
         await ctx.send(embed=embed)
 
+    def resolve_titles(self, songs: List[Song]) -> List[asyncio.Task]:
+        """Search up titles in the background, Return the searching tasks.
+        Searches run concurrently, bounded by API_POOL.
+        """
+        tasks = [
+            asyncio.ensure_future(song.search(self)) for song in songs if song.title is None
+        ]
+        for task in tasks:
+            # Event loop only keeps weak references to tasks.
+            self.title_tasks.add(task)
+            task.add_done_callback(self.title_tasks.discard)
+
+        return tasks
+
     @commands.command(name='shuffle')
     async def _shuffle(self, ctx: commands.Context):
         """Shuffles the queue.
@@ -773,6 +1057,7 @@ class Music(commands.Cog):
             return await ctx.send('Empty queue. ¯\_(ツ)_/¯')
 
         ctx.voice_state.songs.shuffle()  # random.shuffle() moment :)
+        ctx.voice_state.lookahead()
         await ctx.message.add_reaction('✅')
 
     @commands.command(name="sshuffle")
@@ -799,6 +1084,21 @@ class Music(commands.Cog):
             return await ctx.send(f"Index out of range! I only have {songs} tracks in queue!")
 
         ctx.voice_state.songs.remove(index - 1)
+        ctx.voice_state.lookahead()
+        await ctx.message.add_reaction('✅')
+
+    @commands.command(name='move')
+    async def _move(self, ctx: commands.Context, index: int, to: int):
+        """Moves a track in the queue to another position.
+        """
+        songs = len(ctx.voice_state.songs)
+        if not songs:
+            return await ctx.send('Empty queue. ¯\_(ツ)_/¯')
+        if not (1 <= index <= songs and 1 <= to <= songs):
+            return await ctx.send(f"Index out of range! I only have {songs} tracks in queue!")
+
+        ctx.voice_state.songs.move(index - 1, to - 1)
+        ctx.voice_state.lookahead()
         await ctx.message.add_reaction('✅')
 
     @commands.command(name='loop')
@@ -856,19 +1156,16 @@ class Music(commands.Cog):
         if urls is not None:
             log.info(f"{ctx.guild.id}: Recommending song based on {urls}")
             try:
-                songs = getRecommend(urls.split())
+                amount = await self.enqueue_stream(ctx, streamRecommend(urls.split()))
             except NameError:  # couldn't find any match
                 log.info(f"{ctx.guild.id}: Unable to find any matched")
                 return await ctx.send(":x: **Unable to find matched song.**")
             except SpotifyException as e:
                 log.info(f"{ctx.guild.id}: Request fail, {e}")
                 return await ctx.send(":x: **Request fail, Try using Spotify URL.**")
-
-            amount = 0
-            for s in songs:  # load the song
-                pl = Song(s, ctx)
-                await ctx.voice_state.songs.put(pl)
-                amount += 1
+            except asyncio.TimeoutError:
+                log.info(f"{ctx.guild.id}: Recommendation timed out")
+                return await ctx.send(":x: **Spotify is not responding, Please try again later.**")
 
             log.info(f"{ctx.guild.id}: Queued songs.")
             return await ctx.send("Enqueued {} songs.".format(amount))
@@ -911,7 +1208,7 @@ class Music(commands.Cog):
                 return await ctx.send(":x: Bot has reached maximum quota, Youtube Playlist will be disabled.")
 
             try:  # some source of insanity...
-                results = getYtPlaylist(search)
+                results = await fetchYtPlaylist(search)
             except Exception:
                 log.warning(traceback.format_exc())
                 return await ctx.send(":x: PlayList not found (Youtube Mix?) or There is a problem with the bot!")
@@ -920,7 +1217,7 @@ class Music(commands.Cog):
             for url, title in zip(results[0], results[1]):
                 match = re.match(YOUTUBE_REGEX, url)
                 await ctx.voice_state.songs.put(
-                    Song(url, ctx, title)
+                    Song.from_ctx(url, ctx, title)
                 )
                 amount += 1
 
@@ -930,38 +1227,24 @@ class Music(commands.Cog):
         elif "open.spotify.com/playlist/" in search:
             await ctx.typing()
 
-            try:  # somewhere in utils.audio
-                tracks = getTracks(search)
+            try:  # somewhere in utils.spotify
+                amount = await self.enqueue_stream(ctx, streamTracks(search))
             except Exception:
                 log.warning(traceback.format_exc())
                 return await ctx.send(":x: **Failed to load Spotify Playlist!**")
 
-            amount = 0
-            for s in tracks:
-                await ctx.voice_state.songs.put(
-                    Song(s, ctx)
-                )
-                amount += 1
-
-            await ctx.send("Enqueued {} songs.".format(amount))
+            await ctx.send(self.enqueued_message(amount))
 
         elif "open.spotify.com/album/" in search:  # Spotify Album
             await ctx.typing()
 
-            try:  # somewhere in utils.audio
-                tracks = getAlbum(search)
+            try:  # somewhere in utils.spotify
+                amount = await self.enqueue_stream(ctx, streamAlbum(search))
             except Exception:
                 log.warning(traceback.format_exc())
                 return await ctx.send(":x: **Failed to load Spotify Album!**")
 
-            amount = 0
-            for s in tracks:  # put in dataclass and queue
-                await ctx.voice_state.songs.put(
-                    Song(s, ctx)
-                )
-                amount += 1
-
-            await ctx.send("Enqueued {} songs.".format(amount))
+            await ctx.send(self.enqueued_message(amount))
 
         elif "open.spotify.com/" in search:  # Anything else related to Spotify
             return await ctx.send("Sorry, Please use normal search to play this track!")
@@ -977,7 +1260,7 @@ class Music(commands.Cog):
             if videoId is None:
                 return await ctx.send(":x: Unable to regonize the url.")
 
-            song = Song(
+            song = Song.from_ctx(
                 url=f"https://www.youtube.com/watch?v={videoId}", ctx=ctx
             )
 
@@ -985,7 +1268,7 @@ class Music(commands.Cog):
             await ctx.message.add_reaction('✅')
 
         elif search.startswith("http"):  # Just hope ytdlp will work.
-            song = Song(
+            song = Song.from_ctx(
                 url=search,
                 title="unknown",
                 ctx=ctx
@@ -1025,7 +1308,7 @@ class Music(commands.Cog):
             if videoId is None:
                 return await ctx.send(":x: Unable to regonize the url.")
 
-            song = Song(
+            song = Song.from_ctx(
                 url=f"https://www.youtube.com/watch?v={videoId}", ctx=ctx
             )
             await ctx.message.add_reaction('✅')
@@ -1033,10 +1316,35 @@ class Music(commands.Cog):
         else:  # Normal searching.
             song = await self.normal_search(ctx, search)
 
-        ctx.voice_state.songs._queue.appendleft(song)
+        ctx.voice_state.songs.put_first(song)
+        ctx.voice_state.lookahead()
 
         log.debug(f"Enqueued play next")
 
+    async def enqueue_stream(self, ctx: commands.Context, pages: AsyncIterator[List[str]]) -> int:
+        """Enqueue tracks as soon as each page arrives, So the first track plays right away.
+        Return amount of tracks enqueued. Raise only if nothing was enqueued.
+        """
+        amount = 0
+        try:
+            async for tracks in pages:
+                for track in tracks:
+                    await ctx.voice_state.songs.put(Song.from_ctx(track, ctx))
+                amount += len(tracks)
+                ctx.voice_state.start_player()
+        except Exception:
+            if amount == 0:
+                raise
+            log.warning(f"{ctx.guild.id}: Stopped enqueuing after {amount} tracks\n{traceback.format_exc()}")
+
+        return amount
+
+    @staticmethod
+    def enqueued_message(amount: int) -> str:
+        if amount >= config.spotify_track_limit:
+            return "Enqueued {} songs. (Maximum tracks reached)".format(amount)
+        return "Enqueued {} songs.".format(amount)
+
     async def normal_search(self, ctx: commands.Context, search: str) -> None:
         try:
             # Try catching an exception bc we may reach "quota limit" by Google API
@@ -1044,17 +1352,22 @@ class Music(commands.Cog):
             if self.api_error:  # Already error, skip to except statement
                 raise Exception
 
-            ret = getInfo(search)
+            ret = await fetchInfo(search)
         except IndexError:
             raise commands.CommandError("No video found!")
+        except asyncio.TimeoutError:
+            # Slow API, let yt-dlp search it instead.
+            log.warning(f"{ctx.guild.id}: Searching {search} timed out")
+            song = Song.from_ctx(search, ctx)
+            await ctx.message.add_reaction('✅')
         except Exception:
             self.play_error()  # Call play error
-            song = Song(search, ctx)
+            song = Song.from_ctx(search, ctx)
             await ctx.message.add_reaction('✅')
         else:
             url = f"https://www.youtube.com/watch?v={ret['id']['videoId']}"
 
-            song = Song(
+            song = Song.from_ctx(
                 url=url,
                 ctx=ctx,
                 title=ret['snippet']['title']
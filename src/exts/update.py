@@ -4,17 +4,19 @@ Made by Tpmonkey
 """
 
 from discord.ext.tasks import loop
-from discord import Message, TextChannel
+from discord import Message, NotFound, PartialMessage, TextChannel
 from discord.ext.commands import Cog, Context, command, is_owner
 
 import config
 from bot import Bot
+from utils.ratelimit import TokenBucket
 
 import time
 import logging
 import asyncio
 import traceback
 from datetime import datetime
+from typing import Tuple, Union
 
 log = logging.getLogger(__name__)
 MINUTES = config.update_work_cooldown
@@ -24,6 +26,17 @@ class Updater(Cog):
         self.bot = bot
         self.bot.last_check['update'] = {}
 
+        # Discord budget, shared by every guild.
+        self.global_bucket = TokenBucket(*config.update_global_limit)
+        self.channel_buckets = {}
+        # Time took to update each guild, in seconds.
+        self.latency = {}
+        # Message cache stats, for debugging.
+        self.hits = 0
+        self.misses = 0
+        # Updates using cached message IDs since the last history scan, guild ID: count.
+        self.cache_uses = {}
+
         self.updating = False
         self.loop.start()
     
@@ -95,15 +108,53 @@ class Updater(Cog):
         else: 
             await self.bot.log(__name__, "Cannot keep up with update work system. Some Guild maybe affected.")
 
-    async def get_messages(self, channel: TextChannel) -> list:
-        """Get messages from active-works channel, Wil only get its own messages."""
+    async def throttle(self, channel: TextChannel) -> None:
+        """Wait for both channel and global budget before editing/sending/deleting."""
+        if channel.id not in self.channel_buckets:
+            self.channel_buckets[channel.id] = TokenBucket(*config.update_channel_limit)
+        
+        await self.channel_buckets[channel.id].acquire()
+        await self.global_bucket.acquire()
+
+    async def get_messages(self, channel: TextChannel, gid: str, count: int) -> Tuple[list, dict]:
+        """
+        Get messages from active-works channel, Wil only get its own messages.
+        Newest message comes first.
+
+        Use cached message IDs if possible, Messages will be partial messages.
+        Scan channel history otherwise, Digests will be unknown.
+        Cache is not used if it doesn't have one message per work (last update failed halfway),
+        or every `update_rescan_every` updates, to find messages deleted by users.
+        Return messages and known digests, message ID: digest.
+        """
+        cached = self.bot.manager.get_messages(gid)
+        uses = self.cache_uses.get(gid, 0)
+        if (
+            cached is not None and len(cached) == count and uses < config.update_rescan_every
+            and all(isinstance(i, list) for i in cached.values())
+        ):
+            self.hits += 1
+            self.cache_uses[gid] = uses + 1
+            ids = sorted((i[0] for i in cached.values()), reverse = True)
+            return [channel.get_partial_message(i) for i in ids], dict(cached.values())
+
+        self.misses += 1
+        self.cache_uses[gid] = 0
         messages = []
 
         async for message in channel.history(limit=30):
             if message.author.id == self.bot.user.id: 
                 messages.append(message)
             
-        return messages
+        return messages, {}
+
+    def is_same(self, message: Union[Message, PartialMessage], digest: str, known: dict, **work: dict) -> bool:
+        """Check if the message already shows the embed."""
+        if message.id in known:
+            return known[message.id] == digest
+        
+        # Unknown digest, compare the embed itself.
+        return isinstance(message, Message) and self.check(message, **work)
     
     async def update(self) -> None:
         # Disable function until It's completed
@@ -114,37 +165,48 @@ class Updater(Cog):
         # Get data
         data = self.bot.manager.get_all()
         need_update = self.bot.planner.need_update
-        log_msg = ""
-
-        for gid in need_update:
-            # Check if the channel valid or not.
-            if not self.bot.manager.check(gid): 
-                continue
-            
-            self.bot.last_check['update'][gid] = datetime.utcnow()
-            works = self.bot.planner.get_sorted(gid)
+        workers = asyncio.Semaphore(config.update_workers)
 
-            try: 
-                ret = await self.update_active(works, data[gid])
-            except Exception: 
-                log_msg += f"[x] {gid}: {traceback.format_exc(limit = -1)}\n"
-                
-            else:
-                if len(ret) != 2: 
-                    log_msg += f"[/] {gid}: {''.join(ret)}\n"
+        try:
+            results = await asyncio.gather(*[self.update_guild(gid, data, workers) for gid in need_update])
+        finally:
+            self.updating = False
 
-    
+        log_msg = "".join(results)
         if log_msg:
             await self.bot.log(__name__, log_msg)
 
         # If Actually updated something, log it
         if len(need_update) > 0 and time.time() - _s_ > 30: 
-            await self.bot.log(__name__, f"Time took to update all works: {time.time() - _s_}s")
+            slowest = max(need_update, key = lambda gid: self.latency.get(gid, 0))
+            await self.bot.log(
+                __name__, f"Time took to update all works: {time.time() - _s_}s\n"
+                f"Slowest guild: {slowest} ({self.latency.get(slowest, 0):.2f}s)"
+            )
 
-        # Enable this function again
-        self.updating = False
+    async def update_guild(self, gid: str, data: dict, workers: asyncio.Semaphore) -> str:
+        """Update a guild active-works, Return log message."""
+        # Check if the channel valid or not.
+        if not self.bot.manager.check(gid): 
+            return ""
+        
+        async with workers:
+            _s_ = time.perf_counter()
+            self.bot.last_check['update'][gid] = datetime.utcnow()
+            works = self.bot.planner.get_sorted(gid)
+
+            try: 
+                ret = await self.update_active(works, data[gid], gid)
+            except Exception: 
+                return f"[x] {gid}: {traceback.format_exc(limit = -1)}\n"
+            finally:
+                self.latency[gid] = time.perf_counter() - _s_
+                
+            if ret is not None and len(ret) != 2: 
+                return f"[/] {gid}: {''.join(ret)}\n"
+        return ""
     
-    async def update_active(self, works: list, channels: dict, bypass: bool = False) -> list:  
+    async def update_active(self, works: list, channels: dict, gid: str, bypass: bool = False) -> list:  
         """
         Update active-works embed(s).
         
@@ -166,8 +228,28 @@ class Updater(Cog):
         if channel is None: 
             return
 
-        messages = await self.get_messages(channel)
+        try:
+            return await self._update_active(channel, works, gid, bypass)
+        except NotFound:
+            # Someone deleted our message, Cached IDs are outdated.
+            log.debug(f"message not found in {gid}, scanning channel history")
+            self.bot.manager.set_messages(gid, None)
+            return await self._update_active(channel, works, gid, bypass)
+
+    async def _update_active(self, channel: TextChannel, works: list, gid: str, bypass: bool) -> list:
+        messages, known = await self.get_messages(channel, gid, len(works))
+        # assignment key: [message ID, digest], Only messages known to show their work.
+        resolved = {}
 
+        try:
+            return await self._update_messages(channel, works, messages, known, resolved, bypass)
+        finally:
+            # Remember messages, So next update doesn't need to scan the channel.
+            # Failed halfway, Cache has less messages than works and the next update scans.
+            if resolved != self.bot.manager.get_messages(gid):
+                self.bot.manager.set_messages(gid, resolved)
+
+    async def _update_messages(self, channel: TextChannel, works: list, messages: list, known: dict, resolved: dict, bypass: bool) -> list:
         cw = len(works)
         cm = len(messages)
 
@@ -179,51 +261,55 @@ class Updater(Cog):
                 try:
                     work = works[index]                    
                 except IndexError: # Ran out of works.
+                    await self.throttle(channel)
                     await message.delete()
                     messages_output.append("D")
                 else:
-                    if self.check(message, **work) and not bypass: 
+                    digest = self.bot.get_digest(**work)
+                    if self.is_same(message, digest, known, **work) and not bypass: 
+                        resolved[work.get('key')] = [message.id, digest]
                         continue
 
-                    embed = self.bot.get_embed(**works[index])
+                    embed = self.bot.get_embed(**work)
+                    await self.throttle(channel)
                     await message.edit(embed=embed)
+                    resolved[work.get('key')] = [message.id, digest]
                     messages_output.append("E")
-                
-                # Wait a bit before doing next operation.
-                await asyncio.sleep(3)
 
         elif cw > cm: # Case 2
             messages.reverse()
-            works.reverse()
-            for index, work in enumerate(works):        
-                embed = self.bot.get_embed(**work)
+            for index, work in enumerate(reversed(works)):        
+                digest = self.bot.get_digest(**work)
                 try: 
                     message = messages[index]                    
                 except IndexError: # Ran out of embeds to edit.
-                    await channel.send(embed=embed)
+                    await self.throttle(channel)
+                    message = await channel.send(embed=self.bot.get_embed(**work))
+                    resolved[work.get('key')] = [message.id, digest]
                     messages_output.append("S")
                 else:
-                    if self.check(message, **work) and not bypass: 
+                    if self.is_same(message, digest, known, **work) and not bypass: 
+                        resolved[work.get('key')] = [message.id, digest]
                         continue
                     
-                    await messages[index].edit(embed=embed) 
+                    await self.throttle(channel)
+                    await message.edit(embed=self.bot.get_embed(**work)) 
+                    resolved[work.get('key')] = [message.id, digest]
                     messages_output.append("E")
-                
-                # Wait a bit before doing next operation.
-                await asyncio.sleep(3)
         
         else:
             for message, work in zip(messages, works):
-                if self.check(message, **work) and not bypass: 
+                digest = self.bot.get_digest(**work)
+                if self.is_same(message, digest, known, **work) and not bypass: 
+                    resolved[work.get('key')] = [message.id, digest]
                     continue
                 
                 embed = self.bot.get_embed(**work)
+                await self.throttle(channel)
                 await message.edit(embed=embed)
+                resolved[work.get('key')] = [message.id, digest]
                 messages_output.append("E")
 
-                # Wait a bit before doing next operation.
-                await asyncio.sleep(3)
-        
         return messages_output
 
     @command(name='fupdate')
@@ -239,7 +325,7 @@ class Updater(Cog):
         d = self.bot.manager.get_all()
         works = self.bot.planner.get_sorted(gid)
 
-        result = await self.update_active(works, d[gid], True)
+        result = await self.update_active(works, d[gid], gid, True)
         content = "\n".join(result)
 
         await m.edit(content=content)
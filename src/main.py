@@ -8,21 +8,23 @@ Made by Tpmonkey (Nuttee) KUS48
 
 import os
 
-# Setting up Logging.
-from utils.log import setup
-setup()
+# Audio workers are spawned processes, They import this module again as __mp_main__.
+if __name__ == "__main__":
+    # Setting up Logging.
+    from utils.log import setup
+    setup()
 
-# Setting up webserver
-from webserver import keep_alive
-log = keep_alive()
+    # Setting up webserver
+    from webserver import keep_alive
+    log = keep_alive()
 
-# Create and Run the Bot.
-from bot import Bot
+    # Create and Run the Bot.
+    from bot import Bot
 
-import discord
-discord.utils.setup_logging(level=5)
+    import discord
+    discord.utils.setup_logging(level=5)
 
-bot = Bot.create()
+    bot = Bot.create()
 
-token = os.getenv("TOKEN")
-bot.run(token)
\ No newline at end of file
+    token = os.getenv("TOKEN")
+    bot.run(token)
@@ -0,0 +1,27 @@
+"""
+Run blocking HTTP API clients (Youtube Data API, Spotify) without freezing the event loop.
+Uses its own thread pool, So API calls can't starve yt-dlp and the other way around.
+Made by Tpmonkey
+"""
+
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+import config
+
+__all__ = ("API_POOL", "callApi")
+
+# Size of the pool is also the limit of concurrent API calls.
+API_POOL = ThreadPoolExecutor(max_workers = config.music_api_workers, thread_name_prefix = "api")
+
+
+async def callApi(func: Callable, *args: Any, timeout: Optional[float] = None, **kwargs: Any) -> Any:
+    """
+    Call a blocking function in API_POOL, Raise asyncio.TimeoutError if it took too long.
+    Calls still waiting for a thread are dropped on timeout.
+    """
+    loop = asyncio.get_running_loop()
+    future = loop.run_in_executor(API_POOL, functools.partial(func, *args, **kwargs))
+    return await asyncio.wait_for(future, config.music_api_timeout if timeout is None else timeout)
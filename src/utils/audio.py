@@ -1,25 +1,53 @@
 import asyncio
 import functools
 import json
+import logging
 import os
+import time
+import threading
 from concurrent.futures import ThreadPoolExecutor
-from functools import lru_cache
 from typing import List, Optional, Tuple
 from urllib.parse import parse_qs, urlparse
 
+import subprocess
+
 import discord
 import googleapiclient.discovery
+import googleapiclient.http
 import yt_dlp
 
+import config
+from utils.api import callApi
+from utils.audiocache import AudioCache
+from utils.audioworker import WorkerSource, get_pool
+from utils.cache import TTLCache, memoize
+
+log = logging.getLogger(__name__)
+
 # Silence useless bug reports messages
 yt_dlp.utils.bug_reports_message = lambda: ''
 
 __all__ = (
-    "POOL", "YTDLError", "YTDLSource", "DownloadError", "getYtPlaylist", "getInfo", "YOUTUBE_API_KEY", "YOUTUBE_PLAYLIST_KEYWORDS", "youtubeapi"
+    "POOL", "INFO_CACHE", "AUDIO_CACHE", "DEFAULT_VOLUME", "YTDLError", "YTDLSource", "DownloadError", "getYtPlaylist", "getInfo",
+    "fetchYtPlaylist", "fetchInfo", "isStreamExpired", "YOUTUBE_API_KEY", "YOUTUBE_PLAYLIST_KEYWORDS", "youtubeapi"
 )
 
 POOL = ThreadPoolExecutor()
 
+# Volume that can be done by ffmpeg, without decoding to PCM in python.
+DEFAULT_VOLUME = 0.5
+
+# Hot tracks on disk, None if disabled.
+AUDIO_CACHE = AudioCache(config.audio_cache_path, config.audio_cache_size * 2**20) if config.audio_cache_size > 0 else None
+
+# yt-dlp results, video ID: stripped info. Shared across guilds.
+INFO_CACHE = TTLCache(config.music_info_cache * 2**20)
+# Keys YTDLSource needs, the rest (formats, thumbnails, ...) is dropped before caching.
+INFO_KEYS = (
+    "id", "title", "uploader", "uploader_url", "thumbnail", "duration",
+    "webpage_url", "view_count", "like_count", "dislike_count", "url", "is_live"
+)
+
 YOUTUBE_PLAYLIST_KEYWORDS = ("youtube.com/playlist?", "&start_radio", "&list=")
 YOUTUBE_API_KEY = os.getenv("YOUTUBE_API_KEY")
 if YOUTUBE_API_KEY is None:
@@ -48,15 +76,24 @@ chars = {
 
 COOKIES = os.getenv("Cookies")
 
+# httplib2 is not thread-safe, Each API thread gets its own connection.
+_local = threading.local()
+
+
+def _http():
+    if not hasattr(_local, "http"):
+        _local.http = googleapiclient.http.build_http()
+    return _local.http
+
 
-@lru_cache(maxsize=None)
+@memoize(config.music_search_cache * 2**20, config.music_search_ttl * 3600)
 def getInfo(q: str) -> dict:
     _ = _search.list(
         q=q,
         part="id,snippet",
         type="video",
         maxResults=1
-    ).execute()
+    ).execute(http=_http())
 
     _ = _['items'].pop(0)
 
@@ -70,7 +107,7 @@ def getInfo(q: str) -> dict:
     return _
 
 
-@lru_cache(maxsize=None)
+@memoize(config.music_search_cache * 2**20, config.music_playlist_ttl * 3600)
 def getYtPlaylist(url: str) -> Tuple[List[str]]:
     # actually get playlist id
     query = parse_qs(urlparse(url).query, keep_blank_values=True)
@@ -81,13 +118,12 @@ def getYtPlaylist(url: str) -> Tuple[List[str]]:
         playlistId=playlist_id,
         maxResults=50  # 50 vid per request.
     )
-    response = request.execute()
     maximum = 1 if "&start_radio" in url else 8
 
     playlist_items = []
     current = 0
     while request is not None:  # there're more vid to fetch? get it all!!!!
-        response = request.execute()
+        response = request.execute(http=_http())
         playlist_items += response["items"]
         request = youtube.playlistItems().list_next(request, response)
 
@@ -104,6 +140,45 @@ def getYtPlaylist(url: str) -> Tuple[List[str]]:
     return sources, titles
 
 
+def getVideoId(url: str) -> Optional[str]:
+    """Get Youtube video ID from a watch url, None if it's not one."""
+    parsed = urlparse(url)
+    if parsed.netloc.endswith("youtu.be"):
+        return parsed.path.strip("/") or None
+    if parsed.netloc.endswith("youtube.com") and parsed.path == "/watch":
+        return parse_qs(parsed.query).get("v", [None])[0]
+    return None
+
+
+def getStreamTTL(info: dict) -> float:
+    """Seconds until the signed stream url expires, with enough time left to play it."""
+    expire = parse_qs(urlparse(info.get("url", "")).query).get("expire")
+    if expire is None:
+        return 0
+
+    try:
+        return int(expire[0]) - time.time() - (info.get("duration") or 0) - 60
+    except ValueError:
+        return 0
+
+
+def isStreamExpired(info: dict) -> bool:
+    """Signed stream url can't be played to the end anymore, Urls without expiry never are."""
+    if "expire" not in parse_qs(urlparse(info.get("url") or "").query):
+        return False
+    return getStreamTTL(info) <= 0
+
+
+async def fetchInfo(q: str) -> dict:
+    """getInfo, without blocking the event loop."""
+    return await callApi(getInfo, q)
+
+
+async def fetchYtPlaylist(url: str) -> Tuple[List[str]]:
+    """getYtPlaylist, without blocking the event loop."""
+    return await callApi(getYtPlaylist, url)
+
+
 class YTDLError(Exception):
     pass
 
@@ -111,7 +186,7 @@ class YTDLError(Exception):
 DownloadError = yt_dlp.DownloadError
 
 
-class YTDLSource(discord.PCMVolumeTransformer):
+class YTDLSource(discord.AudioSource):
     YTDL_OPTIONS = {
         'format': 'bestaudio/best',
         'outtmpl': 'downloads/%(extractor)s-%(id)s-%(title)s.%(ext)s',
@@ -136,16 +211,24 @@ class YTDLSource(discord.PCMVolumeTransformer):
     #    'options': '-vn -filter:a "asetrate=44100*{pitch},aresample=44100,atempo={speed}/{pitch}"',
     # }
 
-    __slots__ = "data", "uploader", "uploader_url", \
+    __slots__ = "source", "data", "uploader", "uploader_url", \
         "date", "upload_date", "title", "thumbnail", "description", "duration", "tags", \
-        "url", "views", "likes", "dislikes", "stream_url"
+        "url", "views", "likes", "dislikes", "stream_url", "speed", "start", "frames"
 
     ytdl = yt_dlp.YoutubeDL(YTDL_OPTIONS)
 
-    def __init__(self, source: discord.FFmpegPCMAudio, *, data: dict, volume: float = 0.5, speed: float = 1):
-        super().__init__(source, volume)
+    def __init__(self, source: discord.AudioSource, *, data: dict, volume: float = DEFAULT_VOLUME, speed: float = 1, start: float = 0):
+        # Either opus from ffmpeg (sent as it is), or PCM with adjustable volume.
+        if not source.is_opus():
+            source = discord.PCMVolumeTransformer(source, volume)
+        self.source = source
         self.data = data
 
+        # Played position, 20 ms per frame read.
+        self.speed = speed
+        self.start = start
+        self.frames = 0
+
         self.uploader = data.get('uploader')
         self.uploader_url = data.get('uploader_url')
         self.title = data.get('title')
@@ -169,10 +252,62 @@ class YTDLSource(discord.PCMVolumeTransformer):
     def __str__(self):
         return '**{0.title}** by **{0.uploader}**'.format(self)
 
+    def read(self) -> bytes:
+        self.frames += 1
+        return self.source.read()
+
+    @property
+    def position(self) -> float:
+        """Seconds into the track (before effect), Where to seek when playing it again."""
+        return self.start + self.frames * 0.02 * self.speed
+
+    def is_opus(self) -> bool:
+        return self.source.is_opus()
+
+    def cleanup(self) -> None:
+        self.source.cleanup()
+
+    @property
+    def adjustable(self) -> bool:
+        """Volume can be changed while playing, Only in PCM mode."""
+        return isinstance(self.source, (discord.PCMVolumeTransformer, WorkerSource))
+
+    @property
+    def volume(self) -> float:
+        return self.source.volume if self.adjustable else DEFAULT_VOLUME
+
+    @volume.setter
+    def volume(self, value: float) -> None:
+        if self.adjustable:
+            self.source.volume = value
+
+    @property
+    def mode(self) -> str:
+        if isinstance(self.source, WorkerSource):
+            return f"worker {self.source.worker.index}"
+        return "pcm" if self.adjustable else "opus"
+
+    @property
+    def process(self) -> Optional[subprocess.Popen]:
+        """The ffmpeg process, for monitoring. None if it's in a worker."""
+        source = getattr(self.source, "original", self.source)
+        return getattr(source, "_process", None)
+
     @classmethod
     async def create_source(cls, search: str, *, loop: Optional[asyncio.BaseEventLoop] = None, speed: float = 1, pitch: float = 1):
+        info = await cls.extract_info(search, loop=loop)
+        return cls.from_info(info, speed=speed, pitch=pitch)
+
+    @classmethod
+    async def extract_info(cls, search: str, *, loop: Optional[asyncio.BaseEventLoop] = None) -> dict:
+        """Resolve the stream info with yt-dlp, can be done before playing."""
         loop = loop or asyncio.get_event_loop()
 
+        video_id = getVideoId(search)
+        info = INFO_CACHE.get(video_id) if video_id is not None else None
+        if info is not None:
+            return info
+
         webpage_url = search  # process_info['webpage_url']
         cls.ytdl.cache.remove()
         partial = functools.partial(
@@ -197,19 +332,62 @@ class YTDLSource(discord.PCMVolumeTransformer):
         if info.get('is_live'):
             raise YTDLError("Couldn't fetch live video.")
 
+        info = {key: info.get(key) for key in INFO_KEYS}
+        if info["id"] is not None and info["url"] is not None:
+            INFO_CACHE.set(info["id"], info, getStreamTTL(info))
+
+        return info
+
+    @classmethod
+    def from_info(cls, info: dict, *, speed: float = 1, pitch: float = 1, volume: float = DEFAULT_VOLUME, start: float = 0):
+        """Create the source from resolved info, Spawns ffmpeg.
+        Without effect and at default volume, ffmpeg encodes opus itself and
+        nothing is done per frame in python. Otherwise PCM with volume transformer.
+        Start is in seconds, to continue a track from where it was.
+        """
+        before_options = '-reconnect 1 -reconnect_streamed 1 -reconnect_delay_max 5'
+        # Only for playing, Cached files are always the whole track.
+        seek = f" -ss {start:.2f}" if start > 0 else ""
+        no_effect = speed == 1 and pitch == 1
+
         division = min(max(speed / pitch, 0.5), 100)
         division = f",atempo={division}" if division != 1 else ""
         asetrate = ",asetrate=44100" if pitch == 1 else f",asetrate=44100*{pitch}"
 
-        print("Created Source YouTubeDL", division, asetrate,
-              search.strip("https://www.youtube.com/watch?"))
+        # Cached tracks already have effect and default volume, play them as they are.
+        if AUDIO_CACHE is not None and volume == DEFAULT_VOLUME and info.get('id') is not None:
+            key = AUDIO_CACHE.key(info['id'], speed, pitch)
+            path = AUDIO_CACHE.get(key)
+            if path is not None:
+                log.debug(f"Created cached source {info.get('id')} ({key})")
+                # Effect is already in the file, Its timeline is shorter by speed.
+                cached_seek = f"-ss {start / speed:.2f}" if start > 0 else None
+                source = discord.FFmpegOpusAudio(path, before_options=cached_seek, codec='copy', options='-vn')
+                return cls(source, data=info, volume=volume, speed=speed, start=start)
+
+            filters = f"volume={volume}" if no_effect else f"aresample=44100{asetrate}{division},volume={volume}"
+            AUDIO_CACHE.played(key, info['url'], before_options, filters)
+
+        if no_effect and volume == DEFAULT_VOLUME:
+            log.debug(f"Created opus source {info.get('id')}")
+            source = discord.FFmpegOpusAudio(
+                info['url'], before_options=before_options + seek, options=f'-vn -filter:a "volume={volume}"'
+            )
+            return cls(source, data=info, volume=volume, start=start)
+
+        log.debug(f"Created PCM source {info.get('id')} {division} {asetrate}")
 
         opts = {
-            'before_options': '-reconnect 1 -reconnect_streamed 1 -reconnect_delay_max 5',
+            'before_options': before_options + seek,
             'options': f'-vn -filter:a "aresample=44100{asetrate}{division}"',
         }
 
-        return cls(discord.FFmpegPCMAudio(source=info['url'], **opts), data=info, speed=speed)
+        pool = get_pool()
+        if pool is not None:
+            source = pool.open(info['url'], opts['before_options'], opts['options'], volume)
+            return cls(source, data=info, volume=volume, speed=speed, start=start)
+
+        return cls(discord.FFmpegPCMAudio(source=info['url'], **opts), data=info, volume=volume, speed=speed, start=start)
 
     @staticmethod
     def parse_duration(duration: int):
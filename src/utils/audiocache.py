@@ -0,0 +1,144 @@
+"""
+On-disk cache of opus encoded tracks, So hot tracks play from local files instead of streaming again.
+Files are named by the hash of video ID and effect, Least recently played are deleted first.
+Made by Tpmonkey
+"""
+
+import os
+import asyncio
+import hashlib
+import logging
+from collections import Counter, OrderedDict
+from typing import Any, Dict, Optional
+
+__all__ = ("AudioCache", )
+
+log = logging.getLogger(__name__)
+
+# Plays before a track is worth caching, Tracks played once don't cost bandwidth twice.
+HOT_PLAYS = 2
+# Tracks being encoded at the same time.
+STORE_LIMIT = 2
+
+
+class AudioCache:
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        os.makedirs(path, exist_ok = True)
+
+        # key: size, Least recently played comes first.
+        self.__files = OrderedDict()
+        self.bytes = 0
+        self.__load()
+
+        self.plays = Counter()
+        self.storing = set()
+        self.__store_limit = None
+
+        # Stats, for debugging.
+        self.hits = 0
+        self.misses = 0
+
+    def __load(self) -> None:
+        entries = []
+        for entry in os.scandir(self.path):
+            if entry.name.endswith(".part"):
+                # Unfinished from the last run.
+                os.remove(entry.path)
+            elif entry.name.endswith(".ogg"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, entry.name[:-4], stat.st_size))
+
+        for _, key, size in sorted(entries):
+            self.__files[key] = size
+            self.bytes += size
+
+        self.evict()
+
+    @staticmethod
+    def key(video_id: str, speed: float, pitch: float) -> str:
+        """ Content address of a track with its effect. """
+        return hashlib.sha1(f"{video_id}:{speed}:{pitch}".encode()).hexdigest()
+
+    def file(self, key: str) -> str:
+        return os.path.join(self.path, key + ".ogg")
+
+    def get(self, key: str) -> Optional[str]:
+        """ Get path to the cached track, None if it's not cached. """
+        if key not in self.__files or not os.path.exists(self.file(key)):
+            self.__files.pop(key, None)
+            self.misses += 1
+            return None
+
+        self.__files.move_to_end(key)
+        # Keep the order after restarting.
+        os.utime(self.file(key))
+        self.hits += 1
+        return self.file(key)
+
+    def played(self, key: str, url: str, before_options: str, filters: str) -> None:
+        """ Count a play from network, Start caching the track once it's hot. Needs a running event loop. """
+        self.plays[key] += 1
+        if self.plays[key] < HOT_PLAYS or key in self.storing:
+            return
+
+        if len(self.plays) > 10_000:
+            self.plays.clear()
+
+        self.storing.add(key)
+        asyncio.get_event_loop().create_task(self.store(key, url, before_options, filters))
+
+    async def store(self, key: str, url: str, before_options: str, filters: str) -> None:
+        """ Download and encode the track with ffmpeg, in the background. """
+        if self.__store_limit is None:
+            self.__store_limit = asyncio.Semaphore(STORE_LIMIT)
+
+        part = self.file(key) + ".part"
+        try:
+            async with self.__store_limit:
+                process = await asyncio.create_subprocess_exec(
+                    "ffmpeg", *before_options.split(), "-i", url, "-vn", "-filter:a", filters,
+                    "-c:a", "libopus", "-b:a", "128k", "-ar", "48000", "-ac", "2",
+                    "-f", "ogg", "-loglevel", "error", "-y", part,
+                    stdin = asyncio.subprocess.DEVNULL, stdout = asyncio.subprocess.DEVNULL, stderr = asyncio.subprocess.PIPE
+                )
+                _, stderr = await process.communicate()
+
+            if process.returncode != 0:
+                log.warning(f"unable to cache {key}: {stderr.decode(errors = 'ignore')[-300:]}")
+                return
+
+            os.replace(part, self.file(key))
+            size = os.path.getsize(self.file(key))
+            self.__files[key] = size
+            self.bytes += size
+            self.evict()
+            log.debug(f"cached {key}, {size} bytes")
+        except Exception:
+            log.exception(f"unable to cache {key}")
+        finally:
+            self.storing.discard(key)
+            self.plays.pop(key, None)
+            if os.path.exists(part):
+                os.remove(part)
+
+    def evict(self) -> None:
+        """ Delete least recently played tracks until it fits the size limit. """
+        while self.bytes > self.max_bytes and self.__files:
+            key, size = self.__files.popitem(last = False)
+            self.bytes -= size
+            try:
+                os.remove(self.file(key))
+            except OSError:
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        """ Get cache stats. """
+        return {
+            "entries": len(self.__files),
+            "bytes": self.bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "storing": len(self.storing)
+        }
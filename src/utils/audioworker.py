@@ -0,0 +1,332 @@
+"""
+Audio worker processes, Run PCM audio pipelines (ffmpeg, volume, opus encoding) outside the bot process.
+Workers send opus frames back through a pipe, only as many as the bot gave credits for.
+A crashed worker only ends tracks playing on it, and gets respawned.
+Made by Tpmonkey
+"""
+
+import time
+import queue
+import asyncio
+import signal
+import logging
+import itertools
+import threading
+import multiprocessing
+from typing import Any, Dict, List, Optional
+
+import discord
+
+__all__ = ("AudioWorkerPool", "WorkerSource", "start_pool", "get_pool", "stop_pool")
+
+log = logging.getLogger(__name__)
+
+# Frames a worker can send ahead of playback, 20 ms each.
+BUFFER_FRAMES = 100
+# Credits are given back in batches, to keep the pipe quiet.
+CREDIT_BATCH = 25
+# Seconds without a frame before the track is considered dead.
+READ_TIMEOUT = 10
+# Seconds, A worker dying sooner than this after starting waits this long before respawning.
+RESPAWN_BACKOFF = 5
+
+_pool = None
+
+
+class _Stream:
+    __slots__ = "source", "encoder", "credits", "closed"
+
+    def __init__(self, source: discord.PCMVolumeTransformer, credits: int):
+        self.source = source
+        self.encoder = discord.opus.Encoder()
+        self.credits = threading.Semaphore(credits)
+        self.closed = False
+
+
+def _worker_main(conn) -> None:
+    """ Worker process, Run until the pipe is closed or asked to stop. """
+    # Bot handles Ctrl+C, workers are stopped by it.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    if not discord.opus.is_loaded():
+        import ctypes.util
+        discord.opus.load_opus(ctypes.util.find_library("opus"))
+
+    send_lock = threading.Lock()
+    streams = {}
+
+    def send(*message: Any) -> None:
+        with send_lock:
+            try:
+                conn.send(message)
+            except (BrokenPipeError, OSError):
+                pass
+
+    def play(stream_id: int, stream: _Stream) -> None:
+        try:
+            while True:
+                # Wait until the bot wants more frames.
+                stream.credits.acquire()
+                if stream.closed:
+                    break
+
+                pcm = stream.source.read()
+                if not pcm:
+                    break
+                send("frame", stream_id, stream.encoder.encode(pcm, stream.encoder.SAMPLES_PER_FRAME))
+        except Exception as e:
+            send("error", stream_id, repr(e))
+        finally:
+            stream.source.cleanup()
+            streams.pop(stream_id, None)
+            send("end", stream_id)
+
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, OSError):
+            break
+
+        op, stream_id, *args = message
+        if op == "open":
+            url, before_options, options, volume = args
+            try:
+                source = discord.PCMVolumeTransformer(
+                    discord.FFmpegPCMAudio(url, before_options = before_options, options = options), volume
+                )
+            except Exception as e:
+                send("error", stream_id, repr(e))
+                send("end", stream_id)
+                continue
+
+            stream = streams[stream_id] = _Stream(source, BUFFER_FRAMES)
+            threading.Thread(target = play, args = (stream_id, stream), daemon = True).start()
+
+        elif op == "stop":
+            break
+
+        else:
+            # Play thread may remove it any time.
+            stream = streams.get(stream_id)
+            if stream is None:
+                continue
+            
+            if op == "credit":
+                for _ in range(args[0]):
+                    stream.credits.release()
+            elif op == "volume":
+                stream.source.volume = args[0]
+            elif op == "close":
+                stream.closed = True
+                stream.credits.release()
+
+    for stream in list(streams.values()):
+        stream.closed = True
+        stream.credits.release()
+        stream.source.cleanup()
+
+
+class WorkerSource(discord.AudioSource):
+    """ Opus frames from an audio worker, Read by discord voice player thread. """
+    def __init__(self, worker: "AudioWorker", stream_id: int, volume: float):
+        self.worker = worker
+        self.stream_id = stream_id
+        self._volume = volume
+
+        # Opus frames, None means the stream ended.
+        self.frames = queue.Queue()
+        self.consumed = 0
+        self.ended = False
+
+    def is_opus(self) -> bool:
+        return True
+
+    def read(self) -> bytes:
+        if self.ended:
+            return b""
+
+        try:
+            frame = self.frames.get(timeout = READ_TIMEOUT)
+        except queue.Empty:
+            log.warning(f"worker {self.worker.index}: stream {self.stream_id} stalled, ending it")
+            frame = None
+
+        if frame is None:
+            self.ended = True
+            return b""
+
+        # Give credits back, So the worker can send more.
+        self.consumed += 1
+        if self.consumed >= CREDIT_BATCH:
+            self.worker.send("credit", self.stream_id, self.consumed)
+            self.consumed = 0
+
+        return frame
+
+    @property
+    def volume(self) -> float:
+        return self._volume
+
+    @volume.setter
+    def volume(self, value: float) -> None:
+        self._volume = value
+        self.worker.send("volume", self.stream_id, value)
+
+    def cleanup(self) -> None:
+        self.ended = True
+        self.worker.send("close", self.stream_id)
+        self.worker.streams.pop(self.stream_id, None)
+
+
+class AudioWorker:
+    def __init__(self, index: int, context: multiprocessing.context.BaseContext):
+        self.index = index
+        self.context = context
+
+        # stream ID: WorkerSource
+        self.streams = {}
+        self.__send_lock = threading.Lock()
+        # Respawning and closing can't happen at the same time.
+        self.__lifecycle = threading.Lock()
+        self.closing = False
+        self.started = 0.0
+
+        # Stats, for debugging.
+        self.frames = 0
+        self.restarts = 0
+
+        self.process = None
+        self.conn = None
+        self.start()
+
+    def start(self) -> None:
+        self.conn, child = self.context.Pipe()
+        self.process = self.context.Process(
+            target = _worker_main, args = (child, ), name = f"audio-worker-{self.index}", daemon = True
+        )
+        self.process.start()
+        self.started = time.monotonic()
+        child.close()
+
+        threading.Thread(target = self._receive, args = (self.conn, ), daemon = True).start()
+        log.info(f"audio worker {self.index} started, pid {self.process.pid}")
+
+    @property
+    def load(self) -> int:
+        return len(self.streams)
+
+    def send(self, *message: Any) -> None:
+        with self.__send_lock:
+            try:
+                self.conn.send(message)
+            except (BrokenPipeError, OSError):
+                # Worker died, receiving thread will clean up.
+                pass
+
+    def _receive(self, conn) -> None:
+        while True:
+            try:
+                op, stream_id, *args = conn.recv()
+            except (EOFError, OSError):
+                break
+
+            source = self.streams.get(stream_id)
+            if source is None:
+                continue
+
+            if op == "frame":
+                self.frames += 1
+                source.frames.put(args[0])
+            elif op == "end":
+                source.frames.put(None)
+                self.streams.pop(stream_id, None)
+            elif op == "error":
+                log.warning(f"audio worker {self.index}: stream {stream_id} failed, {args[0]}")
+
+        with self.__lifecycle:
+            if self.closing:
+                return
+
+            # Crashed, Only tracks on this worker end.
+            self.process.join(timeout = 1)
+            log.error(f"audio worker {self.index} died (exit code {self.process.exitcode}), respawning")
+            for source in list(self.streams.values()):
+                source.frames.put(None)
+            self.streams.clear()
+
+            # Keeps crashing, Don't spawn it in a loop.
+            if time.monotonic() - self.started < RESPAWN_BACKOFF:
+                time.sleep(RESPAWN_BACKOFF)
+
+            self.restarts += 1
+            self.start()
+
+    def stop(self) -> None:
+        """ Ask the worker to stop, Doesn't wait for it. """
+        with self.__lifecycle:
+            self.closing = True
+            self.send("stop", None)
+            self.conn.close()
+
+    def join(self, timeout: float = 5) -> None:
+        """ Wait for the worker to stop, Kill it if it took too long. Blocking. """
+        self.process.join(timeout = timeout)
+        if self.process.is_alive():
+            self.process.kill()
+
+    def close(self) -> None:
+        self.stop()
+        self.join()
+
+
+class AudioWorkerPool:
+    def __init__(self, size: int):
+        # Fork would copy the whole bot, with its threads and sockets.
+        context = multiprocessing.get_context("spawn")
+        self.workers = [AudioWorker(i, context) for i in range(size)]
+        self.__ids = itertools.count()
+
+    def open(self, url: str, before_options: str, options: str, volume: float) -> WorkerSource:
+        """ Start a stream on the least loaded worker. """
+        worker = min(self.workers, key = lambda w: w.load)
+        stream_id = next(self.__ids)
+
+        source = worker.streams[stream_id] = WorkerSource(worker, stream_id, volume)
+        worker.send("open", stream_id, url, before_options, options, volume)
+        return source
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """ Load of every worker. """
+        return [
+            {"index": w.index, "pid": w.process.pid, "streams": w.load, "frames": w.frames, "restarts": w.restarts}
+            for w in self.workers
+        ]
+
+    def close(self) -> None:
+        """ Stop every worker, Blocking. They stop at the same time, so it takes 5 seconds at most. """
+        for worker in self.workers:
+            worker.stop()
+        deadline = time.monotonic() + 5
+        for worker in self.workers:
+            worker.join(max(0, deadline - time.monotonic()))
+
+
+def start_pool(size: int) -> AudioWorkerPool:
+    """ Start the worker pool, Do nothing if it's already running. """
+    global _pool
+    if _pool is None:
+        _pool = AudioWorkerPool(size)
+    return _pool
+
+
+def get_pool() -> Optional[AudioWorkerPool]:
+    """ Get the worker pool, None if audio runs in the bot process. """
+    return _pool
+
+
+async def stop_pool() -> None:
+    """ Stop the worker pool, Waits in a thread so the event loop keeps running. """
+    global _pool
+    if _pool is not None:
+        pool, _pool = _pool, None
+        await asyncio.get_running_loop().run_in_executor(None, pool.close)
@@ -0,0 +1,174 @@
+"""
+In-memory cache with per-entry expiry and a memory cap.
+Least recently used entries are evicted first once the cap is reached.
+Made by Tpmonkey
+"""
+
+import sys
+import time
+import functools
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, List, Optional
+
+__all__ = ("TTLCache", "memoize", "approx_size")
+
+MISSING = object()
+
+
+def approx_size(value: Any) -> int:
+    """ Rough memory usage of plain data (dict, list, str, numbers) in bytes. """
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(approx_size(k) + approx_size(v) for k, v in value.items())
+    if isinstance(value, (list, tuple, set)):
+        return sys.getsizeof(value) + sum(approx_size(i) for i in value)
+    return sys.getsizeof(value)
+
+
+class TTLCache:
+    def __init__(self, max_bytes: int, ttl: float = 3600):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+
+        # key: (expire at, size, value), Oldest used comes first.
+        self.__data = OrderedDict()
+        self.bytes = 0
+
+        # Stats, for debugging.
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self.__data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key, count = False) is not None
+
+    def get(self, key: Hashable, default: Any = None, *, count: bool = True) -> Any:
+        """ Get a value, Expired value counts as missing. """
+        try:
+            expire, _, value = self.__data[key]
+        except KeyError:
+            self.misses += count
+            return default
+
+        if expire <= time.monotonic():
+            self.pop(key)
+            self.misses += count
+            return default
+
+        self.__data.move_to_end(key)
+        self.hits += count
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """ Set a value, ttl in seconds. Value larger than the cap won't be cached. """
+        ttl = self.ttl if ttl is None else ttl
+        size = approx_size(value)
+
+        self.pop(key)
+        if ttl <= 0 or size > self.max_bytes:
+            return
+
+        self.__data[key] = (time.monotonic() + ttl, size, value)
+        self.bytes += size
+
+        while self.bytes > self.max_bytes:
+            _, (_, size, _) = self.__data.popitem(last = False)
+            self.bytes -= size
+            self.evictions += 1
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        try:
+            _, size, value = self.__data.pop(key)
+        except KeyError:
+            return default
+
+        self.bytes -= size
+        return value
+
+    def clear(self) -> None:
+        self.__data.clear()
+        self.bytes = 0
+
+    def items(self) -> List[tuple]:
+        """ Get every unexpired (key, value, seconds left), Oldest used comes first. """
+        now = time.monotonic()
+        return [(key, value, expire - now) for key, (expire, _, value) in self.__data.items() if expire > now]
+
+    def stats(self) -> Dict[str, int]:
+        """ Get cache stats. """
+        return {
+            "entries": len(self.__data),
+            "bytes": self.bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions
+        }
+
+
+def memoize(max_bytes: int, ttl: float) -> Callable:
+    """
+    Cache results of a blocking function in a TTLCache, Safe to call from many threads.
+    Concurrent calls with the same arguments only run the function once, the rest wait for its result.
+    Errors are not cached.
+
+    Decorated function gets `cache`, `dump()` and `load(items)`, to keep the cache across restarts.
+    """
+    def decorator(func: Callable) -> Callable:
+        cache = TTLCache(max_bytes, ttl)
+        lock = threading.Lock()
+        # args: Future, calls in progress.
+        pending = {}
+
+        @functools.wraps(func)
+        def wrapper(*args):
+            with lock:
+                value = cache.get(args, MISSING)
+                if value is not MISSING:
+                    return value
+
+                future = pending.get(args)
+                if future is None:
+                    future = pending[args] = Future()
+                    owner = True
+                else:
+                    owner = False
+
+            if not owner:
+                return future.result()
+
+            try:
+                value = func(*args)
+            except BaseException as e:
+                with lock:
+                    pending.pop(args, None)
+                future.set_exception(e)
+                raise
+
+            with lock:
+                cache.set(args, value)
+                pending.pop(args, None)
+            future.set_result(value)
+            return value
+
+        def dump() -> List[list]:
+            """ Get unexpired results as [args, value, expire at (unix time)]. """
+            now = time.time()
+            with lock:
+                return [[list(args), value, now + left] for args, value, left in cache.items()]
+
+        def load(items: List[list]) -> None:
+            """ Put results from dump() back into the cache. """
+            now = time.time()
+            with lock:
+                for args, value, expire in items:
+                    cache.set(tuple(args), value, expire - now)
+
+        wrapper.cache = cache
+        wrapper.dump = dump
+        wrapper.load = load
+        return wrapper
+    return decorator
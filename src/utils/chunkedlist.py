@@ -0,0 +1,163 @@
+"""
+List split into small chunks, So removing or inserting in the middle of a long queue only shifts one chunk.
+Index lookup walks chunk lengths (n / CHUNK_SIZE steps) instead of items.
+Made by Tpmonkey
+"""
+
+import random
+import itertools
+from typing import Any, Iterable, Iterator, List
+
+__all__ = ("ChunkedList", )
+
+# Chunks are split once they grow past twice of this.
+CHUNK_SIZE = 256
+
+
+class ChunkedList:
+    def __init__(self, items: Iterable[Any] = ()):
+        self.__chunks = []
+        self.__len = 0
+        self.extend(items)
+
+    def __len__(self) -> int:
+        return self.__len
+
+    def __bool__(self) -> bool:
+        return self.__len > 0
+
+    def __iter__(self) -> Iterator[Any]:
+        return itertools.chain.from_iterable(self.__chunks)
+
+    def __repr__(self) -> str:
+        return f"<ChunkedList len={self.__len} chunks={len(self.__chunks)}>"
+
+    def _locate(self, index: int) -> tuple:
+        """ Get (chunk index, index in chunk) of an item, Negative index counts from the end. """
+        if index < 0:
+            index += self.__len
+        if not 0 <= index < self.__len:
+            raise IndexError("ChunkedList index out of range")
+
+        # Most access is near the front (playing next) or the back (enqueuing).
+        if index >= self.__len // 2:
+            index -= self.__len
+            for i in range(len(self.__chunks) - 1, -1, -1):
+                index += len(self.__chunks[i])
+                if index >= 0:
+                    return i, index
+
+        for i, chunk in enumerate(self.__chunks):
+            if index < len(chunk):
+                return i, index
+            index -= len(chunk)
+
+        raise IndexError("ChunkedList index out of range")
+
+    def __getitem__(self, item: Any) -> Any:
+        if isinstance(item, slice):
+            start, stop, step = item.indices(self.__len)
+            if step < 0:
+                return list(self)[item]
+            if start >= stop:
+                return []
+
+            # Skip whole chunks before start, paging doesn't touch the rest.
+            i, j = self._locate(start)
+            items = itertools.chain(self.__chunks[i][j:], itertools.chain.from_iterable(self.__chunks[i + 1:]))
+            return list(itertools.islice(items, 0, stop - start, step))
+
+        i, j = self._locate(item)
+        return self.__chunks[i][j]
+
+    def __setitem__(self, index: int, value: Any) -> None:
+        i, j = self._locate(index)
+        self.__chunks[i][j] = value
+
+    def __delitem__(self, index: int) -> None:
+        self.pop(index)
+
+    def _split(self, i: int) -> None:
+        chunk = self.__chunks[i]
+        if len(chunk) > CHUNK_SIZE * 2:
+            self.__chunks[i:i + 1] = [chunk[:CHUNK_SIZE], chunk[CHUNK_SIZE:]]
+
+    def append(self, item: Any) -> None:
+        if not self.__chunks or len(self.__chunks[-1]) >= CHUNK_SIZE:
+            self.__chunks.append([])
+        self.__chunks[-1].append(item)
+        self.__len += 1
+
+    def appendleft(self, item: Any) -> None:
+        if not self.__chunks or len(self.__chunks[0]) >= CHUNK_SIZE:
+            self.__chunks.insert(0, [])
+        self.__chunks[0].insert(0, item)
+        self.__len += 1
+
+    def extend(self, items: Iterable[Any]) -> None:
+        for item in items:
+            self.append(item)
+
+    def insert(self, index: int, item: Any) -> None:
+        """ Insert before index, Index past the end appends. """
+        if index < 0:
+            index = max(0, index + self.__len)
+        if index >= self.__len:
+            return self.append(item)
+        if index == 0:
+            return self.appendleft(item)
+
+        i, j = self._locate(index)
+        self.__chunks[i].insert(j, item)
+        self.__len += 1
+        self._split(i)
+
+    def pop(self, index: int = -1) -> Any:
+        i, j = self._locate(index)
+        chunk = self.__chunks[i]
+        item = chunk.pop(j)
+        self.__len -= 1
+        if not chunk:
+            del self.__chunks[i]
+        return item
+
+    def popleft(self) -> Any:
+        return self.pop(0)
+
+    def move(self, source: int, destination: int) -> Any:
+        """ Move an item to destination index, Return the item. """
+        item = self.pop(source)
+        self.insert(destination, item)
+        return item
+
+    def rotate(self, n: int = 1) -> None:
+        """ Rotate n steps to the right, Same as deque.rotate(). """
+        if not self.__len:
+            return
+        n %= self.__len
+        if not n:
+            return
+
+        # Only the moved part is copied, Whole chunks at the front are dropped as they are.
+        k = self.__len - n
+        head = self[:k]
+        self.__len -= k
+        while k and k >= len(self.__chunks[0]):
+            k -= len(self.__chunks.pop(0))
+        if k:
+            del self.__chunks[0][:k]
+        self.extend(head)
+
+    def shuffle(self) -> None:
+        items = list(self)
+        random.shuffle(items)
+        self.clear()
+        self.extend(items)
+
+    def clear(self) -> None:
+        self.__chunks.clear()
+        self.__len = 0
+
+    def chunks(self) -> List[int]:
+        """ Size of every chunk, for debugging. """
+        return [len(chunk) for chunk in self.__chunks]
@@ -3,6 +3,8 @@ Bot Work channel Manager, to keep track all channels across guilds.
 Made by Tpmonkey
 """
 
+from typing import Optional
+
 import logging
 log = logging.getLogger(__name__)
 
@@ -65,9 +67,28 @@ class Manager:
         """ Set Work Channel ID into targeted Guild. """
         self.create_guild(guild_id)
         self.__data[str(guild_id)][type_] = channel_id
+        # Cached messages belong to the old channel.
+        if type_ == "active":
+            self.__data[str(guild_id)].pop("messages", None)
+        
+        self.save()
+
+    def get_messages(self, guild_id: int) -> Optional[dict]:
+        """ Get cached active-works messages, assignment key: [message ID, embed digest]. None if not cached. """
+        return self.__data.get(str(guild_id), {}).get("messages")
+
+    def set_messages(self, guild_id: int, messages: Optional[dict]) -> None:
+        """ Cache active-works messages, Set to None to clear the cache. """
+        if str(guild_id) not in self.__data:
+            return
+        
+        if messages is None:
+            self.__data[str(guild_id)].pop("messages", None)
+        else:
+            self.__data[str(guild_id)]["messages"] = messages
         
         self.save()
 
     def save(self) -> None:
-        """ Save all data. """
-        self.bot.database.dumps("GUILD", self.__data)
\ No newline at end of file
+        """ Save all data, Will be written on the next flush. """
+        self.bot.persist.mark("GUILD", self.__data)
\ No newline at end of file
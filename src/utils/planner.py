@@ -5,21 +5,170 @@ Made by Tpmonkey
 """
 
 import time
+import heapq
+import bisect
 import random
 import discord
 import secrets
 import datetime
-from typing import Optional
+import itertools
+from functools import lru_cache
+from typing import List, NamedTuple, Optional, Tuple
 
+from config import maximum_days
 from utils.time import today_th
 
 import logging
 log = logging.getLogger(__name__)
 
+# Each guild is stored in its own field, so an edit only rewrites that guild.
+# {
+#   "GUILD_ID": {
+#       "key": {...assignment...}
+#   }
+# }
+DB_KEY = "GUILD-WORKS"
+# Old layout, Every guild pickled into one value.
+LEGACY_DB_KEY = "WORKS"
+# Old value is kept here after migrating, So it can't be migrated again over newer data.
+MIGRATED_DB_KEY = "WORKS-MIGRATED"
+
+# Same date strings get parsed over and over (every embed, every update tick).
+# Parse each one only once.
+@lru_cache(maxsize=4096)
+def parse_date(unreadable: str) -> Optional[datetime.datetime]:
+    """ Parse dd/mm/YYYY with any separator, None if unable to. """
+    if len(unreadable) < 3: 
+        return None
+
+    p = unreadable[2]
+    try: 
+        return datetime.datetime.strptime(unreadable, f"%d{p}%m{p}%Y")
+    except ValueError:            
+        p = unreadable[1]
+        try: 
+            return datetime.datetime.strptime(unreadable, f"%d{p}%m{p}%Y")
+        except ValueError: 
+            return None
+
+@lru_cache(maxsize=4096)
+def parse_readable_date(readable: str) -> Optional[datetime.datetime]:
+    """ Parse 'Monday 01 January 2021' format, None if unable to. """
+    try:
+        return datetime.datetime.strptime(readable, "%A %d %B %Y")
+    except ValueError:
+        return None
+
+@lru_cache(maxsize=64)
+def parse_iso_date(date: str) -> datetime.datetime:
+    """ Parse YYYY-mm-dd format, Used by today() and today_th(). """
+    return datetime.datetime.strptime(date, "%Y-%m-%d")
+
+
+class WorkDate(NamedTuple):
+    """ Parsed dates of an assignment, Computed once when added or loaded. """
+    date: Optional[datetime.datetime] # from 'date'
+    readable: Optional[datetime.datetime] # from 'readable-date', None means unknown date.
+    lasted: int
+    # Insertion order, Used to break ties the same way as dict order.
+    seq: int
+
+
+class GuildOrder:
+    """
+    Active (not passed) assignments of a guild, Kept in get_sorted order.
+    Updated on add, remove and passed state change, so reading doesn't need to sort everything.
+    """
+    __slots__ = "invalid", "valid"
+
+    def __init__(self):
+        # [(seq, key)] Unknown dates, In insertion order.
+        self.invalid = []
+        # [(readable, lasted, seq, key)] Sorted by date, then lasted.
+        self.valid = []
+
+    def __len__(self) -> int:
+        return len(self.invalid) + len(self.valid)
+
+    def _entry(self, key: str, parsed: WorkDate) -> tuple:
+        if parsed.readable is None:
+            return self.invalid, (parsed.seq, key)
+        return self.valid, (parsed.readable, parsed.lasted, parsed.seq, key)
+
+    def insert(self, key: str, parsed: WorkDate) -> None:
+        array, entry = self._entry(key, parsed)
+        i = bisect.bisect_left(array, entry)
+        if i == len(array) or array[i] != entry:
+            array.insert(i, entry)
+
+    def remove(self, key: str, parsed: WorkDate) -> None:
+        array, entry = self._entry(key, parsed)
+        i = bisect.bisect_left(array, entry)
+        if i != len(array) and array[i] == entry:
+            del array[i]
+
+    def keys(self, today: datetime.datetime) -> list:
+        """
+        Keys in sorted order, Same order as sorting with sort_format_date.
+        Started ones all count as today, so only they need to be sorted by lasted.
+        """
+        started = bisect.bisect_right(self.valid, (today, float("inf")))
+        return (
+            [key for _, key in self.invalid]
+            + [entry[3] for entry in sorted(self.valid[:started], key = lambda entry: (entry[1], entry[2]))]
+            + [entry[3] for entry in self.valid[started:]]
+        )
+
+
+class Deadlines:
+    """
+    Min-heap of (due, guild_id, key), To find assignments that change state on a day
+    without looking at every assignment.
+    Entries are not removed when an assignment is removed or edited,
+    Instead the token (WorkDate) is checked once popped.
+    """
+    def __init__(self):
+        self.__heap = []
+        self.__count = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self.__heap)
+
+    def push(self, due: datetime.datetime, guild_id: str, key: str, token: WorkDate) -> None:
+        heapq.heappush(self.__heap, (due, next(self.__count), guild_id, key, token))
+
+    def pop_due(self, now: datetime.datetime) -> List[Tuple[str, str, WorkDate]]:
+        """ Pop every entry that is due on or before now. """
+        due = []
+        while self.__heap and self.__heap[0][0] <= now:
+            _, _, guild_id, key, token = heapq.heappop(self.__heap)
+            due.append((guild_id, key, token))
+        return due
+
+    def upcoming(self, limit: int) -> List[Tuple[datetime.datetime, str, str, WorkDate]]:
+        """ Closest entries, Without popping them. """
+        return [(due, guild_id, key, token) for due, _, guild_id, key, token in heapq.nsmallest(limit, self.__heap)]
+
+
 class Planner:
     def __init__(self, bot):
         self.bot = bot
-        self.__data = dict(bot.database.loads("WORKS", {}))
+        self.__data = self._load()
+        self.__seq = itertools.count()
+        # { "GUILD_ID": { "key": WorkDate } }
+        self.__dates = {}
+        # { "GUILD_ID": GuildOrder }
+        self.__order = {}
+        # When assignments become passed, and when they will be deleted.
+        self.__passing = Deadlines()
+        self.__purging = Deadlines()
+
+        for guild_id, works in self.__data.items():
+            self.__dates[guild_id] = {}
+            self.__order[guild_id] = GuildOrder()
+            for key in works:
+                self._index(guild_id, key)
+
         self.__need_update = []
         self.trigger_update()
     
@@ -42,9 +191,7 @@ class Planner:
 
         # Select only guild with an actual update.
         for id in self.get_all_guild():
-            works = self.get_sorted(id)
-            
-            if len(works) == 0:
+            if len(self.__order[str(id)]) == 0:
                 continue
             
             need_update.append(id)           
@@ -116,32 +263,81 @@ class Planner:
         if today < dt: # Not started.
             return (-dt.year, -dt.month, -dt.day, -lasted)
         return (-today.year, -today.month, -today.day, -lasted)
+
+    def _parse(self, work: dict, seq: int = None) -> WorkDate:
+        """ Parse all dates of an assignment. """
+        return WorkDate(
+            date = parse_date(work['date']),
+            readable = parse_readable_date(work['readable-date']),
+            lasted = work.get('lasted', 1),
+            seq = next(self.__seq) if seq is None else seq
+        )
+
+    def _index(self, guild_id: str, key: str, seq: int = None) -> None:
+        """ Parse an assignment, put it in the guild order and schedule its deadlines. """
+        work = self.__data[guild_id][key]
+        parsed = self._parse(work, seq)
+        self.__dates[guild_id][key] = parsed
+
+        if not work['already-passed']:
+            self.__order[guild_id].insert(key, parsed)
+
+            # Same as check_passed_date.
+            if parsed.date is not None:
+                self.__passing.push(parsed.date + datetime.timedelta(days = parsed.lasted), guild_id, key, parsed)
+        
+        # Same as delete_old_work.
+        tracker = parse_date(work.get("date-tracker", work["date"]))
+        if tracker is not None:
+            self.__purging.push(tracker + datetime.timedelta(days = maximum_days), guild_id, key, parsed)
+
+    def _is_current(self, guild_id: str, key: str, token: WorkDate) -> bool:
+        """ Check if a deadline still belongs to the assignment (not removed or edited). """
+        return self.__dates.get(guild_id, {}).get(key) is token
+
+    def upcoming(self, limit: int = 10) -> List[Tuple[datetime.datetime, str, str, str]]:
+        """
+        Upcoming state changes, Sorted by time.
+        Return list of (due, "passed" or "delete", guild_id, key)
+        """
+        upcoming = [
+            (due, name, guild_id, key)
+            for name, deadlines in (("passed", self.__passing), ("delete", self.__purging))
+            for due, guild_id, key, token in deadlines.upcoming(limit * 2)
+            if self._is_current(guild_id, key, token)
+        ]
+        return sorted(upcoming)[:limit]
+
+    def _unindex(self, guild_id: str, key: str) -> None:
+        """ Remove an assignment from the guild order. """
+        parsed = self.__dates[guild_id].pop(key)
+        self.__order[guild_id].remove(key, parsed)
+    
+    def get_date(self, guild_id: int, key: str) -> WorkDate:
+        """
+        Get parsed dates of an Assignment.
+        """
+        return self.__dates[str(guild_id)][key]
     
     def get_sorted(self, guild_id: int) -> list:
         """
         Get sorted assignment by GuildID
         Sort by: invalidDates, Times and How long the event last.
         """
-        data = self.get_all(guild_id)
-        validDate = []
-        invalidDate = []
+        guild_id = str(guild_id)
+        if guild_id not in self.__order:
+            return []
 
-        for i in data:
-            # i is ObservedDict from replit db. if we did not change the type here, Circular reference will happen.
-            i = dict(i) 
-            if self.strp_able(i['readable-date']):
-                i['strp_date'] = datetime.datetime.strptime(i['readable-date'], "%A %d %B %Y")
-                validDate.append(i)
-            else:
-                invalidDate.append(i)
-        
-        validDate = sorted(
-            validDate, 
-            key = lambda item: self.sort_format_date(item['strp_date'], item.get('lasted', 1)),
-            reverse = True
-        )
+        works = []
+        for key in self.__order[guild_id].keys(datetime.datetime.utcnow()):
+            # work is ObservedDict from replit db. if we did not change the type here, Circular reference will happen.
+            work = dict(self.__data[guild_id][key])
+            parsed = self.__dates[guild_id][key]
+            if parsed.readable is not None:
+                work['strp_date'] = parsed.readable
+            works.append(work)
 
-        return invalidDate + validDate
+        return works
 
     def get_embed(self, guild_id: int) -> discord.Embed:
         """
@@ -158,7 +354,9 @@ class Planner:
             ).set_footer(text = "Use add command to add one!")
         
         _sorted = self.get_sorted(guild_id)
+        today = parse_iso_date(today_th())
         formatted = {}
+        dates = {}
         # Idk why, but I wanted the 'formatted' dict to be
         # {
         #   "date": {
@@ -167,11 +365,14 @@ class Planner:
         # }
 
         for value in _sorted:
-            date_key = self.try_strp_date( value['date'] ).strftime("%d-%m-%Y") if self.strp_able( value['readable-date'] ) else "Unknown Date"
+            parsed = self.get_date(guild_id, value['key'])
+            dt = parsed.date or parsed.readable
+            date_key = dt.strftime("%d-%m-%Y") if parsed.readable is not None else "Unknown Date"
 
             if date_key not in formatted:
                 # formatted[date_key] = [ value["key"] ]
                 formatted[date_key] = {}
+                dates[date_key] = dt
             
             # TODO: split between hw and event.
             formatted[date_key][value['key']] = value.get('lasted', 1)
@@ -189,9 +390,11 @@ class Planner:
         for date in formatted:   
             # Create Field Name
             if date == "Unknown Date": 
+                in_days = None
                 name = date
             else:
-                name = self.bot.get_title(self.get_readable_date(date), date)
+                in_days = (dates[date] - today).days
+                name = self.bot.get_title(dates[date].strftime("%A %d %B %Y"), date, gap=in_days)
 
             # Create Field Value
             value = ""
@@ -205,7 +408,6 @@ class Planner:
             embed.add_field(name=name, value=value, inline = False)
 
             # Track the closest day and use for Embed Colour
-            in_days = self.bot.in_days(date)
             if in_days is None: 
                 continue            
             elif closest_day is None or in_days < closest_day: 
@@ -250,9 +452,15 @@ class Planner:
             "lasted": lasted,
             "key": key
         }
+        seq = None
+        if key in self.__dates[str(guild_id)]:
+            # Editing, same key is added again and keeps its place in the dict.
+            seq = self.__dates[str(guild_id)][key].seq
+            self._unindex(str(guild_id), key)
+        self._index(str(guild_id), key, seq)
 
         log.debug("added Assignment from `{}` with key `{}`".format(guild_id, key))
-        self._save() # don't forget to save!
+        self._save(guild_id) # don't forget to save!
         self.__need_update.append(guild_id)
         
         return key
@@ -270,35 +478,38 @@ class Planner:
 
         log.trace("removed {} from {}".format(key, guild_id))
 
+        self._unindex(str(guild_id), key)
         del self.__data[str(guild_id)][key]        
-        self._save()
+        self._save(guild_id)
         self.__need_update.append(guild_id)
         
         return data
 
     async def loop_thro(self) -> dict:
         """
-        Loop through all the Assignments in the system
-        to find the passed one and return it.
+        Find the Assignments that just passed and return it.
+        Only assignments that are due are checked, not all of them.
         """
-        log.debug('looping througth all assignment...')
+        log.debug('checking due assignments...')
         changes = dict()
-        for guild_id in self.__data:
-            for key in self.__data[guild_id]:
-                already_passed = self.check_passed_date(
-                    self.__data[guild_id][key]["date"], 
-                    self.__data[guild_id][key].get("lasted", 1)
-                )
-
-                if already_passed != self.__data[guild_id][key]['already-passed']:
-                    if guild_id not in changes: 
-                        changes[guild_id] = {}
-
-                    self.__data[guild_id][key]['already-passed'] = already_passed
-                    changes[guild_id][key] = self.__data[guild_id][key]
+        for guild_id, key, token in self.__passing.pop_due(parse_iso_date(today_th())):
+            if not self._is_current(guild_id, key, token):
+                continue
+
+            work = self.__data[guild_id][key]
+            if work['already-passed'] or not self.check_passed_date(work["date"], work.get("lasted", 1)):
+                continue
+
+            if guild_id not in changes: 
+                changes[guild_id] = {}
+
+            work['already-passed'] = True
+            self.__order[guild_id].remove(key, token)
+            changes[guild_id][key] = work
         
-        self._save()
-        self.__need_update.append([int(i) for i in changes])
+        for guild_id in changes:
+            self._save(guild_id)
+        self.__need_update.extend(int(i) for i in changes)
         return changes
     
     async def delete_old_work(self) -> int:
@@ -310,23 +521,18 @@ class Planner:
         need_to_delete = {}
         count = 0
 
-        # Finding work to delete.
-        for guild_id in self.__data:
-            for key, data in self.__data[guild_id].items():
-                day_passed = self.bot.in_days(  data.get( "date-tracker", data.get("date") )  )
-
-                if day_passed is None or day_passed >= 0: 
-                    # Unable to identify date or Alrady passed
-                    continue 
+        # Finding work to delete, Only the due ones.
+        for guild_id, key, token in self.__purging.pop_due(parse_iso_date(today_th())):
+            if not self._is_current(guild_id, key, token):
+                continue
 
-                if abs(day_passed) >= self.bot.config.maximum_days: # If It's already passed and more than maximum days.
-                    count += 1
+            count += 1
 
-                    if guild_id not in need_to_delete:
-                        need_to_delete[guild_id] = [key]
-                        continue
-                    
-                    need_to_delete[guild_id].append(key)
+            if guild_id not in need_to_delete:
+                need_to_delete[guild_id] = [key]
+                continue
+            
+            need_to_delete[guild_id].append(key)
 
         # Actually Delete the work to avoid RunTimeError
         for guild_id in need_to_delete:
@@ -336,11 +542,28 @@ class Planner:
         log.debug(f'found {count}')
         return count
 
-    def _save(self) -> None:
+    def _load(self) -> dict:
+        """
+        Load all guilds, Move them over from the old layout if needed.
+        """
+        data = self.bot.database.hloads(DB_KEY)
+        if data:
+            return data
+
+        data = dict(self.bot.database.loads(LEGACY_DB_KEY, {}))
+        if data:
+            log.info(f"migrating {len(data)} guilds from {LEGACY_DB_KEY} to {DB_KEY}")
+            if self.bot.database.hdumps(DB_KEY, data):
+                self.bot.database.renames(LEGACY_DB_KEY, MIGRATED_DB_KEY)
+        return data
+
+    def _save(self, guild_id: int) -> None:
         """
         SAVE!, WHAT DO YOU THINK IT WILL DO?
+        Only the targeted guild is written, Deleted guild will be removed.
         """
-        self.bot.database.dumps("WORKS", self.__data)
+        guild_id = str(guild_id)
+        self.bot.persist.mark_field(DB_KEY, guild_id, self.__data.get(guild_id))
 
     def delete_guild(self, guild_id: int) -> bool:
         """
@@ -348,7 +571,9 @@ class Planner:
         """
         if str(guild_id) in self.__data:
             del self.__data[str(guild_id)]
-            self._save()
+            del self.__dates[str(guild_id)]
+            del self.__order[str(guild_id)]
+            self._save(guild_id)
             
             log.debug(f'deleted {guild_id}')
 
@@ -363,7 +588,9 @@ class Planner:
         """
         if str(guild_id) not in self.__data:
             self.__data[str(guild_id)] = {}            
-            self._save()
+            self.__dates[str(guild_id)] = {}
+            self.__order[str(guild_id)] = GuildOrder()
+            self._save(guild_id)
 
             log.info("added new guild {}".format(guild_id))
             return True
@@ -375,7 +602,7 @@ class Planner:
         """
 
         try:
-            return self.try_strp_date(date) + datetime.timedelta(days = lasted - 1) < datetime.datetime.strptime(today_th(), "%Y-%m-%d") 
+            return self.try_strp_date(date) + datetime.timedelta(days = lasted - 1) < parse_iso_date(today_th())
         except TypeError:
             return False
 
@@ -397,28 +624,13 @@ class Planner:
         """
         Check if the Date that were given stripable or not.
         """
-        try:
-            datetime.datetime.strptime(unreadable, "%A %d %B %Y")
-        except ValueError:
-            return False
-        return True
+        return parse_readable_date(unreadable) is not None
 
     def try_strp_date(self, unreadable: str) -> Optional[datetime.datetime]:
         """
-        Try to Strip given Date, If can't return the given.
+        Try to Strip given Date, If can't return None.
         """        
-        if len(unreadable) < 3: 
-            return None
-
-        p = unreadable[2]
-        try: 
-            return datetime.datetime.strptime(unreadable, f"%d{p}%m{p}%Y")
-        except ValueError:            
-            p = unreadable[1]
-            try: 
-                return datetime.datetime.strptime(unreadable, f"%d{p}%m{p}%Y")
-            except ValueError: 
-                return None
+        return parse_date(unreadable)
 
     def get_readable_date(self, unreadable: str) -> str:
         """
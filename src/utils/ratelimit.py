@@ -0,0 +1,42 @@
+"""
+Token bucket, Use to share Discord rate limit budget between tasks.
+Made by Tpmonkey
+"""
+
+import time
+import asyncio
+
+__all__ = ("TokenBucket", )
+
+
+class TokenBucket:
+    """
+    Allow `rate` operations every `per` seconds, Bursts up to `rate`.
+    Waiters are served in order.
+    """
+    def __init__(self, rate: int, per: float):
+        self.rate = rate
+        self.per = per
+
+        self.tokens = float(rate)
+        self.updated = time.monotonic()
+        self.__lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate / self.per)
+        self.updated = now
+
+    async def acquire(self) -> float:
+        """ Take a token, Wait if there is none. Return time waited in seconds. """
+        waited = 0.0
+        async with self.__lock:
+            self._refill()
+            while self.tokens < 1:
+                delay = (1 - self.tokens) * self.per / self.rate
+                await asyncio.sleep(delay)
+                waited += delay
+                self._refill()
+
+            self.tokens -= 1
+        return waited
@@ -59,8 +59,8 @@ class ReminderManager:
         return self.__data
     
     def save(self) -> None:
-        """Save Data."""
-        self.bot.database.dumps(DB_KEY, self.__data)
+        """Save Data, Will be written on the next flush."""
+        self.bot.persist.mark(DB_KEY, self.__data)
 
     def init_profile(self, uid: int) -> None:
         """
@@ -1,12 +1,19 @@
-from typing import List
+import asyncio
+from typing import AsyncIterator, Callable, List, Optional
 from random import randint
 
+import config
+from utils.api import callApi
+from utils.cache import memoize
+
 # Spotify library.
 import spotipy
 from spotipy.client import SpotifyException
 from spotipy.oauth2 import SpotifyClientCredentials
 
-__all__ = ("getTracks", "getAlbum", "getRecommend", "SpotifyException")
+__all__ = (
+    "streamTracks", "streamAlbum", "streamRecommend", "SpotifyException"
+)
 
 import os
 
@@ -24,55 +31,93 @@ if cid is None or secret is None:
 client_credentials_manager = SpotifyClientCredentials(cid, secret)
 spotify = spotipy.Spotify(client_credentials_manager=client_credentials_manager)
 
-def getTracks(playlistURL: str) -> List[str]:   
-    # Getting a playlist.
-    results = spotify.user_playlist_tracks(user="", playlist_id=playlistURL, offset=0)
-    trackList = []
-    offset = 0
-
-    # Loop untils all the tacks are extracted from playlist.
-    # The reason behind is, Spotify API has limit at 100 tracks at a time, 
-    # So to work around, We use offset insated
-    while len(results["items"]) != 0:
-        for i in results["items"]:
-            trackList.append(f'{i["track"]["name"]} {i["track"]["artists"][0]["name"]}')
-        offset += 100
-        # Get it again, with an offset
-        results = spotify.user_playlist_tracks(user="",playlist_id=playlistURL, offset=offset)
-    return trackList
-
-def getAlbum(albumURL: str) -> List[str]:
-    # Getting a album.
-    results = spotify.album_tracks(albumURL, offset=0)
-    trackList = []
-    offset = 0
-
-    # For each track in the album.
-    while len(results["items"]) != 0:
-        for i in results["items"]:
-            trackList.append(f'{i["name"]} {i["artists"][0]["name"]}')
-        offset += 50
-        results = spotify.album_tracks(albumURL, offset=offset)
-    return trackList
-
-def getRecommend(names: List[str], amount: int = 50) -> List[str]:    
-    # Find uri
+def _playlistTracks(results: dict) -> List[str]:
+    # Removed and local tracks have no track data.
+    return [f'{i["track"]["name"]} {i["track"]["artists"][0]["name"]}' for i in results["items"] if i.get("track")]
+
+def _albumTracks(results: dict) -> List[str]:
+    return [f'{i["name"]} {i["artists"][0]["name"]}' for i in results["items"]]
+
+async def _streamPages(fetch: Callable[[int], dict], parse: Callable[[dict], List[str]], limit: int) -> AsyncIterator[List[str]]:
+    """
+    Yield tracks page by page, in order.
+    Total from the first page is used to fetch the rest of the pages at the same time.
+    """
+    first = await callApi(fetch, 0)
+    total = min(first["total"], limit)
+    yield parse(first)[:total]
+
+    # Only half of API_POOL, So other guilds' searches don't wait behind a big playlist.
+    workers = asyncio.Semaphore(max(1, config.music_api_workers // 2))
+    async def fetchPage(offset: int) -> dict:
+        # Wait here, So time waiting for a thread doesn't count toward the timeout.
+        async with workers:
+            return await callApi(fetch, offset)
+
+    offsets = range(first["limit"], total, first["limit"])
+    pages = [asyncio.ensure_future(fetchPage(offset)) for offset in offsets]
+    try:
+        for offset, page in zip(offsets, pages):
+            yield parse(await page)[:total - offset]
+    finally:
+        for page in pages:
+            page.cancel()
+
+def streamTracks(playlistURL: str, limit: int = config.spotify_track_limit) -> AsyncIterator[List[str]]:
+    """Tracks of a playlist, page by page. Only the first `limit` tracks."""
+    fetch = lambda offset: spotify.user_playlist_tracks(user="", playlist_id=playlistURL, offset=offset)
+    return _streamPages(fetch, _playlistTracks, limit)
+
+def streamAlbum(albumURL: str, limit: int = config.spotify_track_limit) -> AsyncIterator[List[str]]:
+    """Tracks of an album, page by page. Only the first `limit` tracks."""
+    fetch = lambda offset: spotify.album_tracks(albumURL, offset=offset)
+    return _streamPages(fetch, _albumTracks, limit)
+
+@memoize(config.spotify_seed_cache * 2**20, config.music_search_ttl * 3600)
+def searchTrackUri(name: str) -> Optional[str]:
+    """Find track uri from its name, None if not found."""
+    r = spotify.search(q=name, limit=1)
+
+    if len(r['tracks']['items']) == 0: 
+        return None # Not found    
+
+    return r['tracks']['items'][0]['uri']
+
+async def streamRecommend(names: List[str], amount: int = 50) -> AsyncIterator[List[str]]:
+    """
+    Recommendations as one page, To enqueue like playlists.
+    Seed names are searched at the same time, Seeds not found before the deadline are skipped.
+    """
+    searches = {
+        name: None if "open.spotify.com/track/" in name else asyncio.ensure_future(callApi(searchTrackUri, name))
+        for name in names
+    }
+    running = [i for i in searches.values() if i is not None]
+    if running:
+        _, pending = await asyncio.wait(running, timeout = config.spotify_seed_deadline)
+        for task in pending:
+            task.cancel()
+        # Cancelling only asks them to stop, Wait until they did before reading results.
+        await asyncio.gather(*pending, return_exceptions = True)
+
     uris = []
-    for name in names:
-        if "open.spotify.com/track/" in name:
+    error = None
+    for name, task in searches.items():
+        if task is None:
             uris.append(name)
+        elif task.cancelled():
             continue
-        
-        r = spotify.search(q=name, limit=1)
-
-        if len(r['tracks']['items']) == 0: 
-            continue # Not found    
+        elif task.exception() is not None:
+            error = error or task.exception()
+        elif task.result() is not None:
+            uris.append(task.result())
 
-        uris.append(r['tracks']['items'][0]['uri'])
-    
     if len(uris) == 0:
+        # Searching failed, not just nothing found.
+        if error is not None:
+            raise error
         raise NameError
 
     # find recommendations
-    r = spotify.recommendations(seed_tracks=uris, limit=randint(amount, 100)) 
-    return [f'{i["name"]} {i["artists"][0]["name"]}' for i in r['tracks']]
\ No newline at end of file
+    r = await callApi(spotify.recommendations, seed_tracks=uris, limit=randint(amount, 100))
+    yield [f'{i["name"]} {i["artists"][0]["name"]}' for i in r['tracks']]
@@ -0,0 +1,143 @@
+"""
+Write-behind persistence, Collect changes and save them in batches.
+Instead of writing to the database after every single change,
+managers mark a key as dirty and it will be written on the next flush.
+Made by Tpmonkey
+"""
+
+import time
+import asyncio
+from typing import Any, Dict, Optional
+
+import logging
+log = logging.getLogger(__name__)
+
+__all__ = ("WriteBehind", )
+
+
+class WriteBehind:
+    def __init__(self, database, interval: float = 5):
+        self.database = database
+        self.interval = interval
+
+        # key: value
+        self.__dirty = {}
+        # key: {field: value}, None value means delete the field.
+        self.__dirty_fields = {}
+
+        self.__task = None
+        # One flush at a time, So an older write can't land after a newer one.
+        # Created on first flush, Python < 3.10 binds it to the loop running at that time.
+        self.__lock = None
+
+        # Stats, for debugging.
+        self.flushes = 0
+        self.writes = 0
+        self.last_latency = 0.0
+        self.max_latency = 0.0
+
+    @property
+    def pending(self) -> int:
+        """ Amount of values waiting to be written. """
+        return len(self.__dirty) + sum(len(i) for i in self.__dirty_fields.values())
+
+    def mark(self, key: str, value: Any) -> None:
+        """
+        Mark a key as dirty, Value will be written on the next flush.
+        Marking the same key again will only write the latest value.
+        """
+        self.__dirty[key] = value
+
+    def mark_field(self, key: str, field: str, value: Optional[Any]) -> None:
+        """
+        Mark a hash field as dirty, Value will be written on the next flush.
+        Set value to None to delete the field instead.
+        """
+        self.__dirty_fields.setdefault(key, {})[str(field)] = value
+
+    def start(self) -> None:
+        """ Start flushing on an interval, Needs a running event loop. """
+        if self.__task is None or self.__task.done():
+            self.__task = asyncio.get_event_loop().create_task(self._loop())
+
+    async def _loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                # Cancelling the loop (close) must not cut a flush in half.
+                await asyncio.shield(self.flush())
+            except Exception:
+                log.exception("unable to flush dirty keys")
+
+    def _requeue(self, dirty: Dict[str, Any], dirty_fields: Dict[str, Dict[str, Any]]) -> None:
+        """ Mark values dirty again, unless a newer value was marked. """
+        for key, value in dirty.items():
+            self.__dirty.setdefault(key, value)
+
+        for key, fields in dirty_fields.items():
+            retry = self.__dirty_fields.setdefault(key, {})
+            for field, value in fields.items():
+                retry.setdefault(field, value)
+
+    async def flush(self) -> float:
+        """
+        Write every dirty keys to the database, Return time took in seconds.
+        Failed keys will be marked dirty again, unless a newer value was marked.
+        """
+        if self.__lock is None:
+            self.__lock = asyncio.Lock()
+
+        async with self.__lock:
+            return await self._flush()
+
+    async def _flush(self) -> float:
+        if not self.__dirty and not self.__dirty_fields:
+            return 0.0
+
+        t = time.perf_counter()
+        dirty, self.__dirty = self.__dirty, {}
+        dirty_fields, self.__dirty_fields = self.__dirty_fields, {}
+
+        try:
+            if not await self.database.dump_many(dirty):
+                self._requeue(dirty, {})
+
+            for key, fields in dirty_fields.items():
+                sets = {field: value for field, value in fields.items() if value is not None}
+                deletes = [field for field, value in fields.items() if value is None]
+
+                if not (await self.database.hdump(key, sets) and await self.database.hdelete(key, *deletes)):
+                    self._requeue({}, {key: fields})
+        except asyncio.CancelledError:
+            # Writing again is harmless, Losing them is not.
+            self._requeue(dirty, dirty_fields)
+            raise
+
+        self.flushes += 1
+        self.writes += len(dirty) + sum(len(i) for i in dirty_fields.values())
+        self.last_latency = time.perf_counter() - t
+        self.max_latency = max(self.max_latency, self.last_latency)
+
+        log.debug(f"flushed {len(dirty)} keys and {len(dirty_fields)} hashes, took {self.last_latency:.4f}s")
+        if self.last_latency > 1:
+            log.warning(f"flushing took {self.last_latency:.2f}s")
+
+        return self.last_latency
+
+    async def close(self) -> None:
+        """ Stop the interval and flush everything left, Waits for a flush in progress. """
+        if self.__task is not None:
+            self.__task.cancel()
+            self.__task = None
+
+        await self.flush()
+
+    def stats(self) -> Dict[str, Any]:
+        """ Get flush stats. """
+        return {
+            "pending": self.pending,
+            "flushes": self.flushes,
+            "writes": self.writes,
+            "last_latency": self.last_latency,
+            "max_latency": self.max_latency
+        }
@@ -0,0 +1,40 @@
+"""
+Tests for utils.spotify, Spotify API calls are replaced so nothing goes over the network.
+Made by Tpmonkey
+"""
+
+import os
+import sys
+import asyncio
+
+import pytest
+
+# Modules import config and utils as top-level modules.
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+# Nothing is requested, But the module refuses to import without keys.
+os.environ.setdefault("CID", "test")
+os.environ.setdefault("SECRET", "test")
+
+pytest.importorskip("spotipy")
+
+import config
+from utils import spotify
+
+
+def test_recommend_skips_seeds_slower_than_deadline(monkeypatch):
+    async def callApi(func, *args, **kwargs):
+        if func is spotify.searchTrackUri:
+            if args[0] == "slow":
+                await asyncio.sleep(10)
+            return f"spotify:track:{args[0]}"
+        # Recommendations.
+        assert kwargs["seed_tracks"] == ["spotify:track:fast"]
+        return {"tracks": [{"name": "song", "artists": [{"name": "artist"}]}]}
+
+    monkeypatch.setattr(spotify, "callApi", callApi)
+    monkeypatch.setattr(config, "spotify_seed_deadline", 0.05)
+
+    async def collect():
+        return [page async for page in spotify.streamRecommend(["fast", "slow"])]
+
+    assert asyncio.run(collect()) == [["song artist"]]